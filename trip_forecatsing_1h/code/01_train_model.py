@@ -1,10 +1,7 @@
 # Libraries
-import h3 #current version is 3.7.6
-import glob
 import os
 import sys
 import pandas as pd
-import joblib
 import lightgbm as lgb
 import json
 import numpy as np
@@ -21,20 +18,22 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 # Custom functions/settings
-from constants import DATA_DIR, TEMP_DIR, MODEL_DIR, RESOLUTION, part_of_day_labels, day_labels, check_time_list, features_col, target_col
-from func.part_of_day import part_of_day
-from func.season_of_year import season_of_year
-from func.collect_data import collect_data
+from constants import DATA_DIR, MODEL_DIR, MODEL_REGISTRY_DIR, CUBE_DIR, STORE_DIR, FEATURE_STORE_DIR, RESOLUTION, N_WORKERS, part_of_day_labels, day_labels, check_time_list, features_col, target_col
+from func.trip_store import ingest_trip_store, read_trip_store
+from func.trip_history import HISTORY_COLUMNS, trip_history_frame, day_ordinal
+from func.count_cube import update_count_cube
+from func.feature_store import feature_version, update_feature_store, read_feature_store, stored_day_files, dataset_cache_dir
+from func.feature_matrix import build_feature_matrix, build_target
+from func.train_split import time_split
+from func.model_history import previous_model_run
+from func.train_sampling import sample_zero_targets
+from func.train_dataset import FeatureStoreData, cache_dataset, weighted_subset
+from func.tuning import successive_halving
+from func.backtest import rolling_origin_backtest
+from func.model_io import load_model, save_model, publish_model
 
 
 ## Settings
-# clear temp folder
-print("Cleaning temp folder...")
-parquet_files = glob.glob(os.path.join(TEMP_DIR, "*.parquet"))
-for file_path in parquet_files:
-    os.remove(file_path)
-print(f"[OK] Removed {len(parquet_files)} .parquet files from {TEMP_DIR}")
-
 id_date = str(datetime.today().date())
 # id_date = '2025-03-01'
 print("Train data id date: {}".format(id_date))
@@ -52,43 +51,55 @@ date_list = [
 for date in date_list:
     print(date)
 
-start_date = data_selection_end_date
-end_date = data_selection_start_date
-months = []
-current_date = start_date.replace(day=1)
-while current_date <= end_date:
-    months.append(current_date.strftime("%Y-%m"))
-    current_date += relativedelta(months=1)
+# Retraining: 'full' = train from scratch on date_list;
+# 'warm' (opt-in) = continue boosting the previous model (init_model) on the dates after its id_date only, falling back
+# to a full retrain if its test MAE is worse than the previous model's MAE on the same test rows by more than warm_start_tolerance
+retrain_mode = 'full'
+warm_start_tolerance = 0.05
+warm_start_max_trees = 2000    # above this many trees the model is retrained from scratch
+
+# Validation: 'time' = chronological train/validation/test split with early stopping (see func/train_split.py),
+# 'random' = random train/test split with a fixed number of trees
+split_mode = 'time'
+test_size = 0.2
+valid_size = 0.1
+n_estimators = 500             # maximum number of trees
+# Zero-target downsampling of the training rows (1 = keep all): zero rows are kept with this probability
+# and weighted by 1 / zero_keep_rate (see func/train_sampling.py); validation and test rows are not sampled
+zero_keep_rate = 1.0
+early_stopping_rounds = 50     # stop when the validation error did not improve for this many trees
+# Out-of-core full retrain: the binned training data is built day by day from the feature store and cached
+# (see func/train_dataset.py), so the model input of all days is never in memory at once
+out_of_core = False
+# Hyperparameter search: successive halving over func/tuning.py PARAM_GRID on the cached binned data, trials in
+# N_WORKERS processes; the best parameters replace model_params and the model is then trained from scratch
+tune_model = False
+tune_trials = 16               # parameter sets in the first rung
+tune_min_rounds = 50           # trees per trial in the first rung (eta times more in every next rung)
+tune_eta = 3                   # the best 1 / tune_eta of the trials go to the next rung
+# Rolling-origin backtest of the final model parameters (func/backtest.py): backtest_folds test weeks (the last weeks
+# of date_list), each trained on the backtest_train_weeks before it; folds run in N_WORKERS processes
+backtest = False
+backtest_folds = 4
+backtest_train_weeks = 8
+
+# Data selection period: from the first day of the month 24 months back to the end of the cutoff date
+data_selection_start = datetime.combine(data_selection_end_date.replace(day=1), datetime.min.time(), tzinfo=timezone.utc)
+data_selection_end = datetime.combine(data_selection_start_date + timedelta(days = 1), datetime.min.time(), tzinfo=timezone.utc)
 
 
 ## Data collection
-print("Reading necessary json files...")
-df_original_all = pd.DataFrame()
-for month in months:
-    file_path = os.path.join(DATA_DIR, f"data-{month}-01.json")
-    if os.path.exists(file_path):
-        print("Reading {}...".format(file_path))
-        df = pd.read_json(file_path)
-        df_original_all = pd.concat([df_original_all, df], ignore_index=True)
-    else:
-        print(f"⚠️ File not found: {file_path}")
-        
-# Read all data
+print("Updating trip store (only new or changed json files are converted)...")
+ingest_trip_store(DATA_DIR, STORE_DIR, RESOLUTION)
+print("Reading trips from {} to {}...".format(data_selection_start, data_selection_end))
+df_original_all = read_trip_store(STORE_DIR, data_selection_start, data_selection_end, columns = HISTORY_COLUMNS)
+
+# Read all data (slim typed history, see func/trip_history.py)
 print("Feature engineering (1)...")
-df_original_all["start_date_full"] = pd.to_datetime(df_original_all["SpecifiedStartDate"], format="ISO8601", utc=True)
-df_original_all['start_date_year'] = df_original_all['start_date_full'].dt.year
-df_original_all['start_date_month'] = df_original_all['start_date_full'].dt.month
-df_original_all['start_date_season'] = df_original_all['start_date_month'].apply(season_of_year)
-df_original_all['start_date_dow'] = df_original_all['start_date_full'].dt.dayofweek
-df_original_all['is_weekend'] = df_original_all["start_date_dow"].isin([5, 6]).astype(int)
-df_original_all['is_sunday'] = df_original_all["start_date_dow"].isin([6]).astype(int)
-df_original_all['start_date'] = df_original_all['start_date_full'].dt.date
-df_original_all['start_time'] = df_original_all['start_date_full'].dt.time
-df_original_all['start_time_part_of_day'] = df_original_all['start_date_full'].apply(part_of_day)
-df_original_all['h3_cell'] = df_original_all.apply(lambda row: h3.geo_to_h3(row['LatitudeStart'], row['LongitudeStart'], RESOLUTION), axis = 1)
-
-df_original_sel = df_original_all[df_original_all['start_date'] <= cutoff_start_date].sort_values(by = ['SpecifiedStartDate']).reset_index(drop = True)
+df_original_all = trip_history_frame(df_original_all)
+df_original_sel = df_original_all[df_original_all['start_day'] <= day_ordinal(cutoff_start_date)].reset_index(drop = True)
 del df_original_all
+print("Memory usage of the trip history: {:.1f} MB".format(df_original_sel.memory_usage(deep = True).sum() / 1024 ** 2))
 print("Number of rows: {}".format(df_original_sel.shape[0]))
 
 
@@ -96,123 +107,316 @@ start = datetime.now()
 print("Collecting aggregated data to be used for model training...")
 print("Start time: {}".format(start))
 print("NOTE1: date_list is the list of dates for the last 3 months.")
-print("NOTE2: this may take an hour or so.")
-for check_date_str in date_list:
-    for check_time_str in check_time_list:
-        collect_data(df_original_sel, check_date_str, check_time_str, TEMP_DIR, data_type = 'train')
+print("NOTE2: all windows are collected at once from the (h3_cell x 10-minute bucket) count cube.")
+print("NOTE3: the dates are split across {} worker processes sharing the memory-mapped cube.".format(N_WORKERS))
+print("NOTE4: only the dates missing from the feature store are collected; the last date is always recollected.")
+update_count_cube(df_original_sel, CUBE_DIR)
+features_version = feature_version(RESOLUTION, check_time_list)
+df_incomplete = update_feature_store(CUBE_DIR, FEATURE_STORE_DIR, features_version, date_list, check_time_list, complete_until = str(cutoff_start_date), n_workers = N_WORKERS)
 end = datetime.now()
 print(f"[OK] Data collected in {end - start}.")
 del df_original_sel
 
 
 ## Train model and save
-files = list()
-print("Checking aggregated data for:")
-for check_date_str in date_list:
-    print(check_date_str)
-    tmp_files = [f for f in os.listdir(TEMP_DIR) if f.startswith('train_{}_'.format(check_date_str.replace('-', '_')))]
-    files.extend(tmp_files)
-    del tmp_files
-    
-start_2 = datetime.now()
-df_all = pd.DataFrame()
-print("Reading files...")
-print("NOTE: it may take some time")
-for file in files:
-    file_path = os.path.join(TEMP_DIR, file)
-    if os.path.exists(file_path):
-        df_temp = pd.read_parquet(os.path.join(TEMP_DIR, file))
-        df_all = pd.concat([df_all, df_temp], ignore_index = True)
-        del df_temp
-    else:
-        print(f"⚠️ File not found: {file_path}")
-end_2 = datetime.now()
-print(f"[OK] Data read in {end - start}.")
-print("Number of rows: {}".format(df_all.shape[0]))
-
-print("Feature engineering (2)...")
-df_data_02 = df_all.drop(columns = ['is_sunday'])
-df_data_02['day_of_week'] = df_data_02["prediction_date_time_start"].dt.dayofweek
-df_data_02['is_weekend'] = df_data_02["day_of_week"].isin([5, 6]).astype(bool)
-df_data_02['h3_cell_1_month_popularity'] = df_data_02['h3_cell_1_month_popularity'].fillna(0)
-df_data_02['trip_count'] = df_data_02['trip_count'].fillna(0)
-df_data_02['prev_1_hour_cnt'] = df_data_02['prev_1_hour_cnt'].astype(int)
-df_data_02['prev_2_hour_cnt'] = df_data_02['prev_2_hour_cnt'].astype(int)
-df_data_02['prev_3_hour_cnt'] = df_data_02['prev_3_hour_cnt'].astype(int)
-df_data_02['part_of_day'] = df_data_02['part_of_day'].astype(int)
-df_data_02['trip_count_1_year_back'] = df_data_02['trip_count_1_year_back'].astype(int)
-df_data_02['trip_count'] = df_data_02['trip_count'].astype(int)
-
-part_of_day_dummies = pd.get_dummies(df_data_02['part_of_day']).rename(columns=part_of_day_labels)
-df_data_02 = pd.concat([df_data_02, part_of_day_dummies], axis=1)
-for value in part_of_day_labels.values():
-    if value not in df_data_02:
-        df_data_02[value] = False
-
-day_dummies = pd.get_dummies(df_data_02['day_of_week']).rename(columns=day_labels)
-df_data_02 = pd.concat([df_data_02, day_dummies], axis=1)
-for value in day_labels.values():
-    if value not in df_data_02:
-        df_data_02[value] = False
-
-df_data_02 = df_data_02.drop(columns = ['part_of_day', 'day_of_week', 'is_early_morning', 'is_saturday'])
-
-# Train a model
-print("Starting model train...")
-model_output_folder = os.path.join(MODEL_DIR, "model_train_{}_id".format(id_date.replace("-", "_")))
-if not os.path.exists(model_output_folder):
-    os.makedirs(model_output_folder)
-
-X = df_data_02[features_col]
-y = df_data_02[target_col]
-
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-lgb_model = lgb.LGBMRegressor(
+def read_training_data(dates):
+    """
+    Reads the collected windows of the given dates (feature store + incomplete days) as the model input.
+    """
+    start_2 = datetime.now()
+    print("Reading aggregated data for {} dates (feature version {})...".format(len(dates), features_version))
+    df_all = read_feature_store(FEATURE_STORE_DIR, features_version, dates)
+    if df_incomplete.shape[0] > 0:
+        df_new = df_incomplete[df_incomplete['prediction_date_time_start'].dt.strftime('%Y-%m-%d').isin(dates)]
+        df_all = pd.concat([df_all, df_new], ignore_index = True) if df_all.shape[0] > 0 else df_new
+    end_2 = datetime.now()
+    print(f"[OK] Data read in {end_2 - start_2}.")
+    print("Number of rows: {}".format(df_all.shape[0]))
+
+    print("Feature engineering (2)...")
+    X = build_feature_matrix(df_all, features_col, part_of_day_labels, day_labels)
+    y = build_target(df_all, target_col)
+    return X, y, df_all['prediction_date_time_start']
+
+
+def feature_store_data(dates):
+    """
+    Opens the stored windows of the given dates for the out-of-core fit, the tuning and the backtest.
+    """
+    return FeatureStoreData(
+        stored_day_files(FEATURE_STORE_DIR, features_version, dates), features_col, part_of_day_labels, day_labels, target_col
+    )
+
+
+# Folder of the cached binned Dataset (func/train_dataset.py)
+dataset_dir = dataset_cache_dir(FEATURE_STORE_DIR, features_version)
+
+# Parameters of the model (same for the in-memory and the out-of-core fit)
+model_params = dict(
     random_state=42,
     num_leaves = 70,
     learning_rate = 0.05,
-    n_estimators = 500,
     subsample = 0.8,
     colsample_bytree = 0.8
 )
-lgb_model.fit(X_train, y_train)
 
-# Save the model as a file
-model_pkl_path = os.path.join(model_output_folder, "lgb_model_{}.pkl".format(id_date.replace("-", "_")))
-print("Saving model to {}".format(model_pkl_path))
-joblib.dump(lgb_model, model_pkl_path)
-print("Saving model to main folder {} (the model to be used for predictions)".format(MODEL_DIR))
-joblib.dump(lgb_model, os.path.join(MODEL_DIR, 'lgb_model.pkl'))
 
-# check quality (test)
-print("Quality metrics (test data):")
-y_pred_lgb = lgb_model.predict(X_test)
-lgb_mae = mean_absolute_error(y_test, y_pred_lgb)
-print(f"MAE: {lgb_mae:.3f}")
+def split_rows(y, window_start):
+    """
+    Splits the rows (split_mode) and samples the zero-target training rows.
+    Returns the training rows with their sample weights, the validation rows (None for 'random') and the test rows.
+    """
+    if split_mode == 'time':
+        # Train/validation/test split in time (the test windows come after all training windows)
+        train_idx, valid_idx, test_idx = time_split(window_start, test_size = test_size, valid_size = valid_size)
+    else:
+        # Train/test split
+        train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size, random_state=42)
+        valid_idx = None
+    sample_idx, sample_weight = sample_zero_targets(y[train_idx], zero_keep_rate)
+    train_idx = train_idx[sample_idx]
+    print("Train: {} rows | Validation: {} rows | Test: {} rows".format(
+        len(train_idx), 0 if valid_idx is None else len(valid_idx), len(test_idx)
+    ))
+    return train_idx, sample_weight, valid_idx, test_idx
+
+
+def test_metrics(y_test, y_pred_lgb, n_train, n_valid, best_iteration, fit_seconds):
+    """
+    Computes the quality metrics on the test rows.
+    """
+    print("Quality metrics (test data):")
+    lgb_mae = mean_absolute_error(y_test, y_pred_lgb)
+    print(f"MAE: {lgb_mae:.3f}")
+
+    lgb_rmse = np.sqrt(mean_squared_error(y_test, y_pred_lgb))
+    print(f"RMSE: {lgb_rmse:.3f}")
+
+    lgb_r2 = r2_score(y_test, y_pred_lgb)
+    print(f"R²: {lgb_r2:.3f}")
+
+    return {
+        "mae": float(lgb_mae),
+        "rmse": float(lgb_rmse),
+        "r2": float(lgb_r2),
+        "n_test_samples": int(len(y_test)),
+        "n_train_samples": int(n_train),
+        "n_valid_samples": int(n_valid),
+        "split_mode": split_mode,
+        "zero_keep_rate": zero_keep_rate,
+        "out_of_core": False,
+        "best_iteration": int(best_iteration),
+        "fit_seconds": round(fit_seconds, 1)
+    }
+
+
+def fit_model(X, y, window_start, init_model = None):
+    """
+    Splits the windows (split_mode) and fits the model in memory, continuing from init_model if given
+    (then init_model is also scored on the test rows: metrics['init_model_mae']).
+    Returns the Booster, the metrics and the test target/predictions.
+    """
+    lgb_model = lgb.LGBMRegressor(**model_params, n_estimators = n_estimators)
+
+    start_fit = datetime.now()
+    train_idx, sample_weight, valid_idx, test_idx = split_rows(y, window_start)
+    if valid_idx is not None:
+        lgb_model.fit(
+            X[train_idx], y[train_idx],
+            sample_weight = sample_weight,
+            feature_name = features_col,
+            eval_set = [(X[valid_idx], y[valid_idx])],
+            callbacks = [lgb.early_stopping(stopping_rounds = early_stopping_rounds, verbose = False)],
+            init_model = init_model
+        )
+        # best_iteration_ counts the trees of init_model too
+        best_iteration = lgb_model.best_iteration_
+        print("Best iteration: {}".format(best_iteration))
+    else:
+        lgb_model.fit(X[train_idx], y[train_idx], sample_weight = sample_weight, feature_name = features_col, init_model = init_model)
+        best_iteration = lgb_model.booster_.current_iteration()
+    end_fit = datetime.now()
+    print(f"[OK] Model trained in {end_fit - start_fit}.")
+
+    # check quality (test)
+    y_test = y[test_idx]
+    y_pred_lgb = lgb_model.booster_.predict(X[test_idx])
+    metrics = test_metrics(
+        y_test, y_pred_lgb, len(train_idx), 0 if valid_idx is None else len(valid_idx),
+        best_iteration, (end_fit - start_fit).total_seconds()
+    )
+    if init_model is not None:
+        metrics['init_model_mae'] = float(mean_absolute_error(y_test, init_model.predict(X[test_idx])))
+    return lgb_model.booster_, metrics, y_test, y_pred_lgb
+
+
+def fit_model_out_of_core(dates):
+    """
+    Fits the model on the binned Dataset built day by day from the feature store (see func/train_dataset.py);
+    the model input of all days is never in memory at once.
+    Returns the Booster, the metrics and the test target/predictions.
+    """
+    start_2 = datetime.now()
+    data = feature_store_data(dates)
+    print("Number of rows: {}".format(len(data)))
+    full_set = data.dataset(dataset_dir)
+    end_2 = datetime.now()
+    print(f"[OK] Binned training data ready in {end_2 - start_2}.")
+
+    start_fit = datetime.now()
+    train_idx, sample_weight, valid_idx, test_idx = split_rows(data.y, data.window_start)
+    train_set = weighted_subset(full_set, train_idx, sample_weight)
+    train_params = {'objective': 'regression', 'verbose': -1, **model_params}
+    if valid_idx is not None:
+        booster = lgb.train(
+            train_params, train_set,
+            num_boost_round = n_estimators,
+            valid_sets = [full_set.subset(valid_idx)],
+            callbacks = [lgb.early_stopping(stopping_rounds = early_stopping_rounds, verbose = False)]
+        )
+        best_iteration = booster.best_iteration
+        print("Best iteration: {}".format(best_iteration))
+    else:
+        booster = lgb.train(train_params, train_set, num_boost_round = n_estimators)
+        best_iteration = booster.current_iteration()
+    end_fit = datetime.now()
+    print(f"[OK] Model trained in {end_fit - start_fit}.")
+
+    # check quality (test), the test rows are read day by day
+    test_idx = np.sort(test_idx)
+    y_test = data.y[test_idx]
+    y_pred_lgb = data.predict(booster, test_idx)
+    metrics = test_metrics(
+        y_test, y_pred_lgb, len(train_idx), 0 if valid_idx is None else len(valid_idx),
+        best_iteration, (end_fit - start_fit).total_seconds()
+    )
+    metrics['out_of_core'] = True
+    return booster, metrics, y_test, y_pred_lgb
+
 
-lgb_rmse = np.sqrt(mean_squared_error(y_test, y_pred_lgb))
-print(f"RMSE: {lgb_rmse:.3f}")
+print("Starting model train...")
+model_output_folder = os.path.join(MODEL_DIR, "model_train_{}_id".format(id_date.replace("-", "_")))
+if not os.path.exists(model_output_folder):
+    os.makedirs(model_output_folder)
 
-lgb_r2 = r2_score(y_test, y_pred_lgb)
-print(f"R²: {lgb_r2:.3f}")
+# Hyperparameter search on the training/validation windows (the test windows are not used).
+# It runs first: its workers are forked, and LightGBM must not have run in this process before
+if tune_model:
+    start_tune = datetime.now()
+    data = feature_store_data(date_list)
+    train_idx, valid_idx, _ = time_split(data.window_start, test_size = test_size, valid_size = valid_size)
+    sample_idx, sample_weight = sample_zero_targets(data.y[train_idx], zero_keep_rate)
+    best_params, leaderboard = successive_halving(
+        cache_dataset(data, dataset_dir),
+        train_idx[sample_idx], sample_weight, valid_idx, model_params,
+        n_trials = tune_trials,
+        min_rounds = tune_min_rounds,
+        max_rounds = n_estimators,
+        eta = tune_eta,
+        early_stopping_rounds = early_stopping_rounds,
+        n_workers = N_WORKERS
+    )
+    leaderboard_path = os.path.join(model_output_folder, "tuning_leaderboard_{}.csv".format(id_date.replace("-", "_")))
+    print("Saving tuning leaderboard to {}".format(leaderboard_path))
+    leaderboard.to_csv(leaderboard_path, index = False)
+    print("Best parameters: {}".format(best_params))
+    model_params.update(best_params)
+    del data, train_idx, valid_idx, sample_idx, sample_weight
+    end_tune = datetime.now()
+    print(f"[OK] Tuning finished in {end_tune - start_tune}.")
+
+# Backtest of the model parameters (more stable than the single test split).
+# It runs before the final fit: its workers are forked, and LightGBM must not have run in this process before
+backtest_metrics = None
+if backtest:
+    start_backtest = datetime.now()
+    data = feature_store_data(date_list)
+    backtest_metrics = rolling_origin_backtest(
+        data, cache_dataset(data, dataset_dir), model_params,
+        n_folds = backtest_folds,
+        train_weeks = backtest_train_weeks,
+        n_estimators = n_estimators,
+        valid_size = valid_size,
+        early_stopping_rounds = early_stopping_rounds,
+        zero_keep_rate = zero_keep_rate,
+        n_workers = N_WORKERS
+    )
+    del data
+    print("Backtest over {} folds: MAE {:.3f} ± {:.3f} | RMSE {:.3f} | R² {:.3f} | proximity score {:.3f}".format(
+        backtest_metrics['n_folds'], backtest_metrics['mae_mean'], backtest_metrics['mae_std'],
+        backtest_metrics['rmse_mean'], backtest_metrics['r2_mean'], backtest_metrics['proximity_score_soft_mean']
+    ))
+    end_backtest = datetime.now()
+    print(f"[OK] Backtest finished in {end_backtest - start_backtest}.")
+
+# Warm start: continue the previous model on the dates after its training data (not after tuning)
+train_mode = 'full'
+previous_run = previous_model_run(MODEL_DIR, id_date) if retrain_mode == 'warm' and not tune_model else None
+if previous_run is not None:
+    previous_model = load_model(previous_run['model_file'])
+    new_dates = [d for d in date_list if d >= previous_run['id_date']]
+    if previous_run.get('feature_version') != features_version or previous_model.feature_name() != features_col:
+        print("⚠️ The previous model ({}) was trained on other features, training from scratch".format(previous_run['id_date']))
+    elif previous_model.num_trees() + n_estimators > warm_start_max_trees:
+        print("Previous model has {} trees, training from scratch".format(previous_model.num_trees()))
+    elif not new_dates:
+        print("⚠️ No dates after the previous model ({}), training from scratch".format(previous_run['id_date']))
+    else:
+        train_mode = 'warm'
+
+if train_mode == 'warm':
+    print("Warm start from the model of {} on {} new dates".format(previous_run['id_date'], len(new_dates)))
+    X, y, window_start = read_training_data(new_dates)
+    lgb_model, metrics, y_test, y_pred_lgb = fit_model(X, y, window_start, init_model = previous_model)
+    del X, y, window_start
+    # Guard: the continued model must not be clearly worse than the previous one (both scored on the same test rows)
+    print("Previous model MAE on the same test rows: {:.3f}".format(metrics['init_model_mae']))
+    if metrics['mae'] > metrics['init_model_mae'] * (1 + warm_start_tolerance):
+        print("⚠️ Warm-started MAE {:.3f} is worse than the previous model's MAE {:.3f}, falling back to a full retrain".format(
+            metrics['mae'], metrics['init_model_mae']
+        ))
+        train_mode = 'full'
+
+if train_mode == 'full' and out_of_core:
+    # The last day of date_list is incomplete (not stored), the out-of-core fit uses the stored complete days
+    lgb_model, metrics, y_test, y_pred_lgb = fit_model_out_of_core(date_list)
+elif train_mode == 'full':
+    X, y, window_start = read_training_data(date_list)
+    lgb_model, metrics, y_test, y_pred_lgb = fit_model(X, y, window_start)
+    del X, y, window_start
+del df_incomplete
+
+# Save the model (native LightGBM format) and publish it to the registry (the model to be used for predictions)
+model_path = os.path.join(model_output_folder, "lgb_model_{}.txt".format(id_date.replace("-", "_")))
+print("Saving model to {}".format(model_path))
+save_model(lgb_model, model_path)
+# Unique per publish (id date + run time), so a retrain on the same day is a new version that the scoring service swaps in
+model_version = "{}_{}".format(id_date.replace("-", "_"), datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S"))
+print("Publishing model version {} to {}".format(model_version, MODEL_REGISTRY_DIR))
+model_load_ms = publish_model(MODEL_REGISTRY_DIR, lgb_model, model_version)
+print("[OK] Model published (loads in {:.0f} ms)".format(model_load_ms))
 
 metrics = {
     "id_date": str(id_date),
-    "mae": float(lgb_mae),
-    "rmse": float(lgb_rmse),
-    "r2": float(lgb_r2),
-    "n_test_samples": int(len(y_test)),
-    "model_file": model_pkl_path
+    **metrics,
+    "train_mode": train_mode,
+    "init_model_date": previous_run['id_date'] if train_mode == 'warm' else None,
+    "n_trees": int(lgb_model.num_trees()),
+    "feature_version": features_version,
+    "tuned": tune_model,
+    "model_params": model_params,
+    "backtest": backtest_metrics,
+    "model_file": model_path,
+    "model_version": model_version,
+    "model_load_ms": round(model_load_ms, 1)
 }
-print("Saving quality metrics to {}".format(model_pkl_path))
+print("Saving quality metrics to {}".format(model_output_folder))
 metrics_path = os.path.join(model_output_folder, "metrics_{}.json".format(id_date.replace("-", "_")))
 with open(metrics_path, "w", encoding="utf-8") as f:
     json.dump(metrics, f, indent=2, ensure_ascii=False)
 
 
-print("Saving Actual vs Predicted figure to {}".format(model_pkl_path))
+print("Saving Actual vs Predicted figure to {}".format(model_output_folder))
 plt.figure(figsize=(8, 6))
 plt.scatter(y_test, y_pred_lgb, alpha=0.3)
 plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--')
@@ -226,15 +430,15 @@ plt.close()
 
 
 
-importance = lgb_model.feature_importances_
-features = X_train.columns
+importance = lgb_model.feature_importance()
+features = features_col
 feature_importance_df = pd.DataFrame({
     'feature': features,
     'importance': importance
 }).sort_values(by='importance', ascending=False)
 feature_importance_df['importance_pct'] = 100 * feature_importance_df['importance'] / feature_importance_df['importance'].sum()
 
-print("Saving Feature Importance figure to {}".format(model_pkl_path))
+print("Saving Feature Importance figure to {}".format(model_output_folder))
 plt.figure(figsize=(12, 6))
 sns.barplot(data=feature_importance_df.head(20), x='importance_pct', y='feature', palette='viridis')
 plt.title("Top 20 Feature Importances (LGBMRegressor)")
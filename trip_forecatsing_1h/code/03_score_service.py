@@ -0,0 +1,121 @@
+# Libraries
+import os
+import sys
+import time
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Set whole project visibility
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Custom functions/settings
+from constants import DATA_DIR, MODEL_REGISTRY_DIR, RESULT_DIR, STORE_DIR, RESOLUTION, part_of_day_labels, day_labels, features_col
+from func.trip_store import TripFeed, ingest_trip_store, read_trip_store
+from func.count_cube import to_epoch_ns
+from func.online_features import OnlineFeatureState, SLOT_RING_DAYS
+from func.collect_data_batch import collect_data_batch
+from func.feature_matrix import build_feature_matrix
+from func.model_io import current_model_version, load_current_model
+
+
+## Settings
+# The window of every 10-minute mark is scored this many seconds later (as in check_time_list: 00:02, 00:12, ...)
+TICK_DELAY_SECONDS = 120
+
+
+def floor_10_minutes(date_time):
+    return date_time.replace(minute=(date_time.minute // 10) * 10, second=0, microsecond=0)
+
+
+def score_window(state, lgb_model, select_date_time):
+    """
+    Collects the features of one window from the online feature state and predicts it (same steps as 02_predict.py).
+    """
+    df_all = collect_data_batch(state, [str(select_date_time.date())], [select_date_time.strftime("%H:%M:%S")], data_type = 'score')
+    if df_all.shape[0] == 0:
+        return pd.DataFrame(columns = ['id_timestamp', 'h3_cell', 'trip_count_predict_raw', 'trip_count_predict'])
+
+    X_score = build_feature_matrix(df_all, features_col, part_of_day_labels, day_labels)
+    df_result = df_all[['id_timestamp', 'h3_cell']].copy()
+    df_result['trip_count_predict_raw'] = lgb_model.predict(X_score)
+    df_result['trip_count_predict'] = df_result['trip_count_predict_raw'].round(0).astype(int)
+    return df_result
+
+
+## Resident state: model + history
+print("Reading model...")
+model_version, lgb_model, load_ms = load_current_model(MODEL_REGISTRY_DIR)
+if lgb_model is None:
+    sys.exit("No published model in {} (run 01_train_model.py first)".format(MODEL_REGISTRY_DIR))
+print("[OK] Model {} loaded in {:.0f} ms".format(model_version, load_ms))
+
+now = datetime.now(timezone.utc)
+loaded_until = floor_10_minutes(now)
+# The online state covers one year back + one hour (the oldest feature window)
+history_start = datetime.combine(loaded_until.date() - timedelta(days = SLOT_RING_DAYS - 1), datetime.min.time(), tzinfo=timezone.utc)
+# The json files of the previous and the current month are followed by the trip feed (trips keep arriving in them),
+# the older months are read from the store
+feed_start = (loaded_until.replace(day=1) - timedelta(days = 1)).replace(day=1, hour=0, minute=0)
+print("Loading history from {} to {}...".format(history_start, loaded_until))
+start = time.perf_counter()
+ingest_trip_store(DATA_DIR, STORE_DIR, RESOLUTION)
+df_history = read_trip_store(STORE_DIR, history_start, feed_start)
+feed = TripFeed(DATA_DIR, RESOLUTION, feed_start.strftime("%Y-%m"))
+df_pending = feed.poll()
+is_due = df_pending['SpecifiedStartDate'] < loaded_until
+df_history = pd.concat([df_history, df_pending[is_due]], ignore_index = True)
+# Trips starting after loaded_until wait until their window is scored
+df_pending = df_pending[~is_due]
+state = OnlineFeatureState()
+state.add_trips(to_epoch_ns(df_history['SpecifiedStartDate']), df_history['h3_index'].to_numpy())
+print("[OK] {} trips loaded in {:.0f} ms".format(df_history.shape[0], 1000 * (time.perf_counter() - start)))
+del df_history
+
+
+## Scoring loop: one window every 10 minutes
+print("Scoring service started (Ctrl+C to stop)")
+while True:
+    now = datetime.now(timezone.utc)
+    next_tick = floor_10_minutes(now) + timedelta(seconds = TICK_DELAY_SECONDS)
+    if next_tick <= now:
+        next_tick += timedelta(minutes = 10)
+    time.sleep((next_tick - now).total_seconds())
+
+    select_date_time = floor_10_minutes(next_tick)
+
+    # Hot swap: a newly published model is loaded between two ticks (the old one scores until it is ready)
+    if current_model_version(MODEL_REGISTRY_DIR) != model_version:
+        try:
+            new_version, new_model, load_ms = load_current_model(MODEL_REGISTRY_DIR)
+            model_version, lgb_model = new_version, new_model
+            print("[OK] Switched to model {} (loaded in {:.0f} ms)".format(model_version, load_ms))
+        except Exception as e:
+            print("⚠️ Model {} could not be loaded, scoring with {}: {}".format(current_model_version(MODEL_REGISTRY_DIR), model_version, e))
+    text_datetime_id = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
+
+    # Append the trips that arrived since the previous tick (only the appended json records are parsed);
+    # late trips starting before loaded_until are added to the state too.
+    # A failing tick is logged and the service carries on with the next one (the trips stay pending).
+    try:
+        start = time.perf_counter()
+        df_pending = pd.concat([df_pending, feed.poll()], ignore_index = True)
+        is_due = df_pending['SpecifiedStartDate'] < select_date_time
+        df_new = df_pending[is_due]
+        n_late = int((df_new['SpecifiedStartDate'] < loaded_until).sum())
+        n_new = state.add_trips(to_epoch_ns(df_new['SpecifiedStartDate']), df_new['h3_index'].to_numpy())
+        df_pending = df_pending[~is_due]
+        loaded_until = select_date_time
+        append_ms = 1000 * (time.perf_counter() - start)
+
+        # Score the window and save the result
+        start = time.perf_counter()
+        df_result = score_window(state, lgb_model, select_date_time)
+        df_result.to_json(os.path.join(RESULT_DIR, "prediction_{}.json".format(text_datetime_id)), orient="records", lines=True)
+        score_ms = 1000 * (time.perf_counter() - start)
+
+        print("[OK] {}: {} new trips ({} late), {} cells scored | append {:.0f} ms, score {:.0f} ms".format(
+            text_datetime_id, n_new, n_late, df_result.shape[0], append_ms, score_ms
+        ))
+    except Exception as e:
+        print("⚠️ Window {} could not be scored: {}".format(text_datetime_id, e))
@@ -0,0 +1,133 @@
+# Libraries
+import os
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Set whole project visibility
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Custom functions/settings
+from constants import DATA_DIR, MODEL_REGISTRY_DIR, RESULT_DIR, STORE_DIR, RESOLUTION, part_of_day_labels, day_labels, check_time_list, features_col
+from func.trip_store import ingest_trip_store, read_trip_store_ranges
+from func.trip_history import HISTORY_COLUMNS, TripHistory, trip_history_frame
+from func.count_cube import build_count_cube_ranges
+from func.collect_data_batch import collect_data_batch, feature_history_ranges, merge_time_ranges
+from func.feature_matrix import build_feature_matrix
+from func.model_io import load_current_model
+from func.proximity_score import proximity_score_soft
+from func.h3_index import h3_cell_geometry
+
+## Settings
+# Backfill period (both dates included); one score_YYYY_MM_all.parquet is written per month
+# (the rows of the other dates of an existing month file are kept)
+backfill_start_date = '2025-05-01'
+backfill_end_date = '2025-05-31'
+model_version = None    # version of the model registry to score with (None = the current one)
+
+# Columns of the app-ready files (see trip_prediction_JAN2025/data)
+score_col = [
+    'h3_cell', 'prev_1_hour_cnt', 'id_timestamp', 'prev_2_hour_cnt', 'prev_3_hour_cnt',
+    '1_weeks_back_moving_avg', '2_weeks_back_moving_avg', '3_weeks_back_moving_avg', '4_weeks_back_moving_avg',
+    'h3_cell_1_month_popularity', 'h3_cell_1_week_popularity', 'trip_count_1_year_back',
+    'prediction_date_time_start', 'prediction_date_time_end', 'is_weekend', 'trip_count',
+    'is_late_night', 'is_morning', 'is_late_morning', 'is_midday', 'is_afternoon', 'is_evening', 'is_late_evening',
+    'is_monday', 'is_tuesday', 'is_wednesday', 'is_thursday', 'is_friday', 'is_sunday',
+    'trip_count_predict', 'trip_count_predict_accuracy', 'trip_count_predict_round', 'trip_count_predict_round_accuracy',
+    'lat', 'lon', 'boundary'
+]
+
+start_date = datetime.strptime(backfill_start_date, "%Y-%m-%d").date()
+end_date = datetime.strptime(backfill_end_date, "%Y-%m-%d").date()
+date_list = [
+    (start_date + timedelta(days=i)).isoformat()
+    for i in range((end_date - start_date).days + 1)
+]
+print("Backfill period: {} - {} ({} dates x {} windows)".format(backfill_start_date, backfill_end_date, len(date_list), len(check_time_list)))
+
+# Data selection: the time ranges read by the features and the actuals of all windows
+history_ranges = list()
+for check_date_str in date_list:
+    for check_time_str in check_time_list:
+        select_date_time = datetime.strptime(check_date_str + ' ' + check_time_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        select_date_time = select_date_time.replace(minute=(select_date_time.minute // 10) * 10, second=0)
+        history_ranges.extend(feature_history_ranges(select_date_time, data_type = 'train'))
+history_ranges = merge_time_ranges(history_ranges)
+for range_start, range_end in history_ranges:
+    print("Data selection: {} - {}".format(range_start, range_end))
+
+
+## Data collection
+ingest_trip_store(DATA_DIR, STORE_DIR, RESOLUTION)
+df_original_sel = trip_history_frame(read_trip_store_ranges(STORE_DIR, history_ranges, columns = HISTORY_COLUMNS))
+print("Number of rows: {}".format(df_original_sel.shape[0]))
+
+# Features and actuals of all windows at once (data_type 'train' also collects trip_count)
+start = datetime.now()
+print("Collecting features...")
+cube = build_count_cube_ranges(TripHistory(df_original_sel), history_ranges)
+df_all = collect_data_batch(cube, date_list, check_time_list, data_type = 'train')
+del cube, df_original_sel
+end = datetime.now()
+print(f"[OK] Data collected in {end - start}.")
+print("Number of rows: {}".format(df_all.shape[0]))
+
+
+## Making predictons (one call for all windows)
+X_score = build_feature_matrix(df_all, features_col, part_of_day_labels, day_labels)
+print("Reading model...")
+model_version, lgb_model, load_ms = load_current_model(MODEL_REGISTRY_DIR, model_version)
+if lgb_model is None:
+    sys.exit("No published model in {} (run 01_train_model.py first)".format(MODEL_REGISTRY_DIR))
+print("[OK] Model {} loaded in {:.0f} ms".format(model_version, load_ms))
+start = datetime.now()
+print("Predicting {} rows...".format(X_score.shape[0]))
+y_pred = lgb_model.predict(X_score)
+end = datetime.now()
+print(f"[OK] Predicted in {end - start}.")
+
+# App-ready columns: collected features + calendar flags of the model input + predictions
+df_result = df_all.drop(columns = ['is_weekend', 'is_sunday', 'part_of_day'])
+del df_all
+for col in ['prev_1_hour_cnt', 'prev_2_hour_cnt', 'prev_3_hour_cnt', 'trip_count_1_year_back', 'trip_count']:
+    df_result[col] = df_result[col].fillna(0).astype(np.int32)
+df_result['h3_cell_1_month_popularity'] = df_result['h3_cell_1_month_popularity'].fillna(0)
+for col in ['prediction_date_time_start', 'prediction_date_time_end']:
+    df_result[col] = df_result[col].dt.as_unit('us')
+for col in features_col:
+    if col not in df_result:
+        df_result[col] = X_score[:, features_col.index(col)] > 0
+del X_score
+
+# Predictions, accuracy against the actuals and cell geometry
+df_result['trip_count_predict'] = y_pred
+df_result['trip_count_predict_accuracy'] = proximity_score_soft(df_result['trip_count'], y_pred).round(2)
+df_result['trip_count_predict_round'] = df_result['trip_count_predict'].round(0).astype(np.int32)
+df_result['trip_count_predict_round_accuracy'] = proximity_score_soft(df_result['trip_count'], df_result['trip_count_predict_round']).round(2)
+df_result = df_result.merge(h3_cell_geometry(df_result['h3_cell'].unique()), on = 'h3_cell', how = 'left')
+df_result = df_result[score_col]
+
+print("Accuracy: {:.2f} | Rounded accuracy: {:.2f}".format(
+    df_result['trip_count_predict_accuracy'].mean(), df_result['trip_count_predict_round_accuracy'].mean()
+))
+
+
+## Save the result (one file per month, merged with the rows of the other dates of an existing file)
+month_of_row = df_result['prediction_date_time_start'].dt.strftime('%Y_%m')
+for month, df_month in df_result.groupby(month_of_row, sort = True):
+    output_path = os.path.join(RESULT_DIR, "score_{}_all.parquet".format(month))
+    if os.path.exists(output_path):
+        df_existing = pd.read_parquet(output_path)
+        df_existing = df_existing[~df_existing['prediction_date_time_start'].dt.strftime('%Y-%m-%d').isin(date_list)]
+        print("Keeping {} rows of the other dates of {}".format(df_existing.shape[0], output_path))
+        if df_existing.shape[0] > 0:
+            df_month = pd.concat([df_existing.reindex(columns = score_col), df_month], ignore_index = True)
+            df_month = df_month.sort_values(by = ['prediction_date_time_start', 'h3_cell'], kind = 'stable')
+    print("Saving {} rows to {}".format(df_month.shape[0], output_path))
+    # Written under a temporary name first, so a reader never sees a half-written file
+    tmp_path = output_path + '.tmp'
+    df_month.reset_index(drop = True).to_parquet(tmp_path, index = False)
+    os.replace(tmp_path, output_path)
+print("Backfill is ready!")
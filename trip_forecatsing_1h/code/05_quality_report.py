@@ -0,0 +1,43 @@
+# Libraries
+import glob
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Set whole project visibility
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Custom functions/settings
+from constants import RESULT_DIR, QUALITY_DIR
+from func.score_quality import GROUPS, update_score_quality, quality_report
+
+## Settings
+# Score files to evaluate (written by 04_backfill.py)
+score_paths = sorted(glob.glob(os.path.join(RESULT_DIR, 'score_*_all.parquet')))
+stats_dir = os.path.join(QUALITY_DIR, 'stats')
+
+
+## Evaluation (only new or changed score files are read)
+start = datetime.now()
+print("Evaluating {} score files...".format(len(score_paths)))
+if not score_paths:
+    print("⚠️ No score files in {}".format(RESULT_DIR))
+    sys.exit(0)
+update_score_quality(score_paths, stats_dir)
+report = quality_report(score_paths, stats_dir)
+end = datetime.now()
+print(f"[OK] Quality report built in {end - start}.")
+
+for row in report['month'].itertuples(index = False):
+    print("{} | rows: {} | MAE: {:.3f} | bias: {:+.3f} | RMSE: {:.3f} | accuracy: {:.2f} | rounded accuracy: {:.2f}".format(
+        row.key, row.n, row.mae, row.bias, row.rmse, row.accuracy, row.round_accuracy
+    ))
+
+
+## Save the report (one csv per group)
+for group in GROUPS:
+    output_path = os.path.join(QUALITY_DIR, "quality_{}.csv".format(group))
+    print("Saving {} rows to {}".format(report[group].shape[0], output_path))
+    report[group].to_csv(output_path, index = False)
+print("Quality report is ready!")
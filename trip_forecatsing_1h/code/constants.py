@@ -9,6 +9,14 @@ DATA_DIR = os.path.join('..', 'data')
 TEMP_DIR = os.path.join('..', 'temp')
 MODEL_DIR = os.path.join('..', 'model')
 RESULT_DIR = os.path.join('..', 'result')
+CUBE_DIR = os.path.join('..', 'cube')
+STORE_DIR = os.path.join('..', 'store')
+FEATURE_STORE_DIR = os.path.join('..', 'features')
+QUALITY_DIR = os.path.join('..', 'result', 'quality')
+MODEL_REGISTRY_DIR = os.path.join('..', 'model', 'registry')
+
+# Parallel feature collection - number of worker processes
+N_WORKERS = os.cpu_count() or 1
 
 # For feature engineering
 part_of_day_labels = {
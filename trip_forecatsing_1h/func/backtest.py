@@ -0,0 +1,157 @@
+"""
+backtest.py
+
+This module runs a rolling-origin backtest of the model on the stored training windows:
+
+    fold k:  | train (train_weeks) | gap | test (1 week) |
+    the test weeks are the last n_folds weeks of the data, one after another; every fold trains only on
+    the windows before its test week (the last valid_size of them for early stopping, see func/train_split.py)
+
+The folds run in parallel worker processes. Every worker loads the cached binned Dataset (func/train_dataset.py)
+once and trains on subsets of it; the test rows are predicted from the stored days (FeatureStoreData.predict).
+
+Output: MAE, RMSE, R² and the mean proximity_score_soft (func/proximity_score.py) of every fold,
+plus their mean and standard deviation over the folds.
+"""
+
+import multiprocessing
+import os
+import numpy as np
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from func.count_cube import DAY_NS, to_epoch_ns
+from func.proximity_score import proximity_score_soft
+from func.train_dataset import DATASET_PARAMS, weighted_subset
+from func.train_sampling import sample_zero_targets
+from func.train_split import WINDOW_LENGTH, time_split
+
+WEEK_NS = 7 * DAY_NS
+
+# Metrics aggregated over the folds
+FOLD_METRICS = ['mae', 'rmse', 'r2', 'proximity_score_soft']
+
+# Training data of the worker process (set by the initializer)
+_worker_data = None
+
+
+def rolling_origin_folds(window_start, n_folds, train_weeks, gap = WINDOW_LENGTH):
+    """
+    Builds the folds of the backtest; the last test week ends with the last day of the data.
+
+    Parameters:
+        window_start (array-like): prediction_date_time_start of every row.
+        n_folds (int): Number of folds (test weeks).
+        train_weeks (int): Weeks of training windows before every test week.
+        gap (timedelta): Training windows starting less than gap before the test week are dropped.
+
+    Returns:
+        list: (train_idx, test_idx, test start in ns) of every fold with training and test rows, oldest first.
+    """
+    start_ns = to_epoch_ns(window_start)
+    data_end = (start_ns.max() // DAY_NS + 1) * DAY_NS
+    gap_ns = int(gap.total_seconds() * 10**9)
+    folds = list()
+    for k in range(n_folds, 0, -1):
+        test_from = data_end - k * WEEK_NS
+        train_idx = np.flatnonzero((start_ns >= test_from - train_weeks * WEEK_NS) & (start_ns <= test_from - gap_ns))
+        test_idx = np.flatnonzero((start_ns >= test_from) & (start_ns < test_from + WEEK_NS))
+        if train_idx.shape[0] == 0 or test_idx.shape[0] == 0:
+            print("⚠️ Backtest fold {} skipped (no training or test windows)".format(n_folds - k))
+            continue
+        folds.append((train_idx, test_idx, int(test_from)))
+    return folds
+
+
+def _init_worker(dataset_path, data):
+    global _worker_data
+    _worker_data = (lgb.Dataset(dataset_path, params = DATASET_PARAMS).construct(), data)
+
+
+def _run_fold(args):
+    train_idx, test_idx, test_from, train_params, n_estimators, valid_size, early_stopping_rounds, zero_keep_rate = args
+    full_set, data = _worker_data
+    start = perf_counter()
+    # Early stopping on the last training windows of the fold
+    fit_idx, valid_idx, _ = time_split(data.window_start.iloc[train_idx], test_size = 0, valid_size = valid_size)
+    fit_idx, valid_idx = train_idx[fit_idx], train_idx[valid_idx]
+    sample_idx, sample_weight = sample_zero_targets(data.y[fit_idx], zero_keep_rate)
+    train_set = weighted_subset(full_set, fit_idx[sample_idx], sample_weight)
+    booster = lgb.train(
+        train_params, train_set,
+        num_boost_round = n_estimators,
+        valid_sets = [full_set.subset(valid_idx)],
+        callbacks = [lgb.early_stopping(stopping_rounds = early_stopping_rounds, verbose = False)]
+    )
+    y_test = data.y[test_idx]
+    y_pred = data.predict(booster, test_idx)
+    return {
+        'test_start': str(np.datetime64(test_from, 'ns').astype('datetime64[D]')),
+        'n_train_samples': int(sample_idx.shape[0]),
+        'n_test_samples': int(test_idx.shape[0]),
+        'best_iteration': int(booster.best_iteration),
+        'mae': float(mean_absolute_error(y_test, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        'r2': float(r2_score(y_test, y_pred)),
+        'proximity_score_soft': float(proximity_score_soft(y_test, y_pred).mean()),
+        'fit_seconds': round(perf_counter() - start, 1)
+    }
+
+
+def rolling_origin_backtest(
+    data,                       # FeatureStoreData of the backtest days
+    dataset_path,               # binary Dataset file of data (FeatureStoreData.dataset)
+    model_params,               # model parameters (LGBMRegressor names)
+    n_folds = 4,                # number of test weeks
+    train_weeks = 8,            # weeks of training windows per fold
+    n_estimators = 500,         # maximum number of trees
+    valid_size = 0.1,           # share of the training windows of a fold used for early stopping
+    early_stopping_rounds = 50, # early stopping patience
+    zero_keep_rate = 1.0,       # zero-target downsampling of the training rows (func/train_sampling.py)
+    n_workers = 1               # number of worker processes
+):
+    """
+    Runs the rolling-origin backtest (one fold per worker task).
+
+    Returns:
+        dict: Settings, metrics of every fold and the mean / std of FOLD_METRICS over the folds.
+    """
+    global _worker_data
+    # Workers are forked (the scripts have no __main__ guard, so spawned workers would re-run them);
+    # the caller must not have run LightGBM before (OpenMP is not fork-safe), see train_dataset.cache_dataset
+    if 'fork' not in multiprocessing.get_all_start_methods() and n_workers > 1:
+        print("⚠️ 'fork' start method is not available, running the backtest in a single process")
+        n_workers = 1
+
+    folds = rolling_origin_folds(data.window_start, n_folds, train_weeks)
+    n_workers = max(1, min(n_workers, len(folds)))
+    train_params = {'objective': 'regression', 'verbose': -1, 'num_threads': max(1, (os.cpu_count() or 1) // n_workers), **model_params}
+    tasks = [
+        (train_idx, test_idx, test_from, train_params, n_estimators, valid_size, early_stopping_rounds, zero_keep_rate)
+        for train_idx, test_idx, test_from in folds
+    ]
+    init_args = (dataset_path, data)
+    print("Backtest: {} folds x {} training weeks with {} workers...".format(len(folds), train_weeks, n_workers))
+    if n_workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=init_args
+        ) as executor:
+            fold_metrics = list(executor.map(_run_fold, tasks))
+    else:
+        _init_worker(*init_args)
+        try:
+            fold_metrics = [_run_fold(task) for task in tasks]
+        finally:
+            _worker_data = None
+
+    result = {'n_folds': len(fold_metrics), 'train_weeks': train_weeks, 'test_weeks': 1}
+    for name in FOLD_METRICS:
+        values = np.array([fold[name] for fold in fold_metrics], dtype=np.float64)
+        result[name + '_mean'] = float(values.mean()) if values.shape[0] > 0 else None
+        result[name + '_std'] = float(values.std()) if values.shape[0] > 0 else None
+    result['folds'] = fold_metrics
+    return result
@@ -13,18 +13,21 @@ Output:
     - Saves a parquet file to ../temp/ with extracted features and true labels (if available)
 
 Requirements:
-    - Data must be preloaded in the variable df_original_all
+    - Data must be preloaded in the variable df_original_all as the slim trip history
+      (func/trip_history.py: start_date_full, start_day, h3_index)
 """
 
 import os
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
-from func.part_of_day import part_of_day
+from func.part_of_day import part_of_day_array
+from func.trip_history import TripHistory, day_ordinal
+from func.h3_index import h3_to_str
 
 
 def collect_data(
-    df_original_sel,    # filtered historical dataframe
+    df_original_sel,    # filtered historical dataframe or its TripHistory
     check_date_str,     # e.g., "2025-05-01"
     check_time_str,     # e.g., "14:00:00"
     output_folder,      # where to save the result (aka temp train data)
@@ -38,94 +41,57 @@ def collect_data(
 
     floored_minute = (check_date_time.minute // 10) * 10
     select_date_time = check_date_time.replace(minute=floored_minute, second=0, microsecond=0)
+    select_day = select_date_time.replace(hour=0, minute=0)
     print("ID date: {}".format(select_date_time))
 
+    # Time-indexed history: every window below is a binary-search slice
+    history = df_original_sel if isinstance(df_original_sel, TripHistory) else TripHistory(df_original_sel)
+
     # Count of the started trips in the previous windows
-    df_part_1_1 = df_original_sel[
-        (df_original_sel['start_date_full'] >= (select_date_time - timedelta(hours = 1))) &
-        (df_original_sel['start_date_full'] < select_date_time)
-    ].reset_index(drop = True)
-    df_part_1_1 = df_part_1_1.groupby(by = ['h3_cell'], as_index = False)['start_date'].count().rename(columns = {'start_date': 'prev_1_hour_cnt'})
+    df_part_1_1 = history.slice(select_date_time - timedelta(hours = 1), select_date_time).reset_index(drop = True)
+    df_part_1_1 = df_part_1_1.groupby(by = ['h3_index'], as_index = False)['start_day'].count().rename(columns = {'start_day': 'prev_1_hour_cnt'})
     df_part_1_1['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
-    df_part_1_2 = df_original_sel[
-        (df_original_sel['start_date_full'] >= (select_date_time - timedelta(hours = 2))) &
-        (df_original_sel['start_date_full'] < (select_date_time - timedelta(hours = 1)))
-    ].reset_index(drop = True)
-    df_part_1_2 = df_part_1_2.groupby(by = ['h3_cell'], as_index = False)['start_date'].count().rename(columns = {'start_date': 'prev_2_hour_cnt'})
+    df_part_1_2 = history.slice(select_date_time - timedelta(hours = 2), select_date_time - timedelta(hours = 1)).reset_index(drop = True)
+    df_part_1_2 = df_part_1_2.groupby(by = ['h3_index'], as_index = False)['start_day'].count().rename(columns = {'start_day': 'prev_2_hour_cnt'})
     df_part_1_2['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
-    df_part_1_3 = df_original_sel[
-        (df_original_sel['start_date_full'] >= (select_date_time - timedelta(hours = 3))) &
-        (df_original_sel['start_date_full'] < (select_date_time - timedelta(hours = 2)))
-    ].reset_index(drop = True)
-    df_part_1_3 = df_part_1_3.groupby(by = ['h3_cell'], as_index = False)['start_date'].count().rename(columns = {'start_date': 'prev_3_hour_cnt'})
+    df_part_1_3 = history.slice(select_date_time - timedelta(hours = 3), select_date_time - timedelta(hours = 2)).reset_index(drop = True)
+    df_part_1_3 = df_part_1_3.groupby(by = ['h3_index'], as_index = False)['start_day'].count().rename(columns = {'start_day': 'prev_3_hour_cnt'})
     df_part_1_3['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))   
-    df_part_1 = df_part_1_1.merge(df_part_1_2, how = 'left', on = ['h3_cell', 'id_timestamp']).merge(df_part_1_3, how = 'left', on = ['h3_cell', 'id_timestamp'])
+    df_part_1 = df_part_1_1.merge(df_part_1_2, how = 'left', on = ['h3_index', 'id_timestamp']).merge(df_part_1_3, how = 'left', on = ['h3_index', 'id_timestamp'])
 
     # Popularity of the h3 cell during last month/30 days
-    df_part_2_1 = df_original_sel[
-        (df_original_sel['start_date'] >= (select_date_time.date() - relativedelta(months = 1))) & 
-        (df_original_sel['start_date'] < select_date_time.date())
-    ]
-    df_part_2_1 = df_part_2_1.groupby(by = ['h3_cell'], as_index = False)['start_date'].count()
-    df_part_2_1['start_date'] = df_part_2_1['start_date'] / df_part_2_1['start_date'].max()
-    df_part_2_1.rename(columns = {'start_date': 'h3_cell_1_month_popularity'}, inplace = True)
+    df_part_2_1 = history.slice(select_day - relativedelta(months = 1), select_day)
+    df_part_2_1 = df_part_2_1.groupby(by = ['h3_index'], as_index = False)['start_day'].count()
+    df_part_2_1['start_day'] = df_part_2_1['start_day'] / df_part_2_1['start_day'].max()
+    df_part_2_1.rename(columns = {'start_day': 'h3_cell_1_month_popularity'}, inplace = True)
     # Popularity of the h3 cell during last week/7 days
-    df_part_2_2 = df_original_sel[
-        (df_original_sel['start_date'] >= (select_date_time.date() - timedelta(days = 7))) & 
-        (df_original_sel['start_date'] < select_date_time.date())
-    ]
-    df_part_2_2 = df_part_2_2.groupby(by = ['h3_cell'], as_index = False)['start_date'].count()
-    df_part_2_2['start_date'] = df_part_2_2['start_date'] / df_part_2_2['start_date'].max()
-    df_part_2_2.rename(columns = {'start_date': 'h3_cell_1_week_popularity'}, inplace = True)
-    df_part_2 = pd.merge(left = df_part_2_1, right = df_part_2_2, how = 'outer', on = ['h3_cell'])
+    df_part_2_2 = history.slice(select_day - timedelta(days = 7), select_day)
+    df_part_2_2 = df_part_2_2.groupby(by = ['h3_index'], as_index = False)['start_day'].count()
+    df_part_2_2['start_day'] = df_part_2_2['start_day'] / df_part_2_2['start_day'].max()
+    df_part_2_2.rename(columns = {'start_day': 'h3_cell_1_week_popularity'}, inplace = True)
+    df_part_2 = pd.merge(left = df_part_2_1, right = df_part_2_2, how = 'outer', on = ['h3_index'])
     df_part_2[['h3_cell_1_month_popularity', 'h3_cell_1_week_popularity']] = df_part_2[['h3_cell_1_month_popularity', 'h3_cell_1_week_popularity']].fillna(0)
     df_part_2['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
 
     # Moving average for the same day of week during the last four weeks
-    df_temp = df_original_sel[
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 7))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 7) + timedelta(hours = 1)))
-        ) | 
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 14))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 14) + timedelta(hours = 1)))
-        ) |
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 21))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 21) + timedelta(hours = 1)))
-        ) | 
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 28))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 28) + timedelta(hours = 1)))
-        ) |
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 35))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 35) + timedelta(hours = 1)))
-        ) |
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 42))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 42) + timedelta(hours = 1)))
-        ) |
-        (
-            (df_original_sel['start_date_full'] >= (select_date_time - timedelta(days = 49))) & 
-            (df_original_sel['start_date_full'] <= (select_date_time - timedelta(days = 49) + timedelta(hours = 1)))
-        )
-    ]
+    df_temp = pd.concat([
+        history.slice(select_date_time - timedelta(days = days_back), select_date_time - timedelta(days = days_back) + timedelta(hours = 1), include_end = True)
+        for days_back in [49, 42, 35, 28, 21, 14, 7]
+    ])
     df_part_3 = pd.DataFrame()
     for step in [1, 2, 3, 4]:
         id_date = str(step) + '_weeks_back_moving_avg'
         df_temp_step = df_temp[
-            (df_temp['start_date'] <= (select_date_time.date() - timedelta(days = 7 * step))) &
-            (df_temp['start_date'] >= (select_date_time.date() - timedelta(days = 7 * (step + 3))))
-        ].groupby(by = ['h3_cell', 'start_date'], as_index = False)['start_date_full'].count().rename(columns = {'start_date_full': 'trip_count'})
+            (df_temp['start_day'] <= day_ordinal(select_date_time) - 7 * step) &
+            (df_temp['start_day'] >= day_ordinal(select_date_time) - 7 * (step + 3))
+        ].groupby(by = ['h3_index', 'start_day'], as_index = False)['start_date_full'].count().rename(columns = {'start_date_full': 'trip_count'})
         df_temp_step['id_moving_average'] = id_date
         df_part_3 = pd.concat([df_part_3, df_temp_step], ignore_index = True)
         del df_temp_step
     del df_temp
     df_part_3 = df_part_3.sort_values(by = ['trip_count'], ascending = [True]).reset_index(drop = True)
-    df_part_3 = df_part_3.groupby(by = ['h3_cell', 'id_moving_average'], as_index = False)['trip_count'].mean()
-    df_part_3 = df_part_3.pivot(index = 'h3_cell', values = 'trip_count', columns = 'id_moving_average').reset_index(drop = False)
+    df_part_3 = df_part_3.groupby(by = ['h3_index', 'id_moving_average'], as_index = False)['trip_count'].mean()
+    df_part_3 = df_part_3.pivot(index = 'h3_index', values = 'trip_count', columns = 'id_moving_average').reset_index(drop = False)
     df_part_3['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
     for step in [1, 2, 3, 4]:
         if '{}_weeks_back_moving_avg'.format(step) not in df_part_3:
@@ -133,17 +99,14 @@ def collect_data(
     df_part_3 = df_part_3.fillna(0)
     
     # Trips count one year ago
-    df_part_4 = df_original_sel[
-        (df_original_sel['start_date_full'] >= (select_date_time - relativedelta(months = 12))) & 
-        (df_original_sel['start_date_full'] < (select_date_time - relativedelta(months = 12) + timedelta(hours = 1)))
-    ].reset_index(drop = True)
-    df_part_4 = df_part_4.groupby(by = ['h3_cell'], as_index = False)['start_date'].count().rename(columns = {'start_date': 'trip_count_1_year_back'})
+    df_part_4 = history.slice(select_date_time - relativedelta(months = 12), select_date_time - relativedelta(months = 12) + timedelta(hours = 1)).reset_index(drop = True)
+    df_part_4 = df_part_4.groupby(by = ['h3_index'], as_index = False)['start_day'].count().rename(columns = {'start_day': 'trip_count_1_year_back'})
     df_part_4['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
 
     # Set all 3 parts into one
-    df_features = pd.merge(df_part_1, df_part_3, how = 'outer', on = ['h3_cell', 'id_timestamp'])\
-    .merge(df_part_2, how = 'left', on = ['h3_cell', 'id_timestamp'])\
-    .merge(df_part_4, how = 'left', on = ['h3_cell', 'id_timestamp'])
+    df_features = pd.merge(df_part_1, df_part_3, how = 'outer', on = ['h3_index', 'id_timestamp'])\
+    .merge(df_part_2, how = 'left', on = ['h3_index', 'id_timestamp'])\
+    .merge(df_part_4, how = 'left', on = ['h3_index', 'id_timestamp'])
     df_features['prev_1_hour_cnt'] = df_features['prev_1_hour_cnt'].fillna(0)
     df_features['prev_2_hour_cnt'] = df_features['prev_2_hour_cnt'].fillna(0)
     df_features['prev_3_hour_cnt'] = df_features['prev_3_hour_cnt'].fillna(0)
@@ -155,23 +118,22 @@ def collect_data(
     df_features['prediction_date_time_end'] = select_date_time + timedelta(hours = 1)
     df_features['is_weekend'] = df_features["prediction_date_time_start"].isin([5, 6]).astype(int)
     df_features['is_sunday'] = df_features["prediction_date_time_start"].isin([6]).astype(int)
-    df_features['part_of_day'] = df_features['prediction_date_time_start'].apply(part_of_day)
+    df_features['part_of_day'] = part_of_day_array(df_features['prediction_date_time_start'])
 
     # Collect and save statuses
     if data_type == 'score':
         df_collect_all = df_features.copy()
     else:
-        df_status = df_original_sel[
-            (df_original_sel['start_date_full'] >= select_date_time) & 
-            (df_original_sel['start_date_full'] < (select_date_time + timedelta(hours = 1)))
-        ].reset_index(drop = True)
-        df_status = df_status.groupby(by = ['h3_cell'], as_index = False)['start_date'].count().rename(columns = {'start_date': 'trip_count'})
+        df_status = history.slice(select_date_time, select_date_time + timedelta(hours = 1)).reset_index(drop = True)
+        df_status = df_status.groupby(by = ['h3_index'], as_index = False)['start_day'].count().rename(columns = {'start_day': 'trip_count'})
         df_status['id_timestamp'] = '{}_{}'.format(str(select_date_time.date()).replace('-', '_'), str(select_date_time.time()).replace(':', '_'))
 
         # Merge features with statuses
-        df_collect_all = pd.merge(df_features, df_status, how = 'outer', on = ['h3_cell', 'id_timestamp'])
+        df_collect_all = pd.merge(df_features, df_status, how = 'outer', on = ['h3_index', 'id_timestamp'])
         
     df_collect_all = df_collect_all[~df_collect_all['prediction_date_time_start'].isna()].reset_index(drop = True)
+    # h3 strings are produced only here, at the output boundary
+    df_collect_all.insert(0, 'h3_cell', h3_to_str(df_collect_all.pop('h3_index').to_numpy(dtype='uint64')))
     df_collect_all.to_parquet(
         os.path.join(
             output_folder,
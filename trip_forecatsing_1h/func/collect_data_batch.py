@@ -0,0 +1,212 @@
+"""
+collect_data_batch.py
+
+This module provides a batched version of collect_data for taxi demand prediction.
+It extracts the features of many 1-hour prediction windows at once from a TripCountCube
+instead of scanning the historical trips once per window.
+
+Input:
+    - cube: TripCountCube built from the historical data (func/count_cube.py)
+    - check_date_list: list of strings (e.g., ['2025-05-01', '2025-05-02'])
+    - check_time_list: list of strings (e.g., ['14:02:00', '14:12:00'])
+    - data_type: 'train' or 'score'
+
+Output:
+    - DataFrame with the same rows, columns and values as the concatenated outputs of collect_data
+      for every (date, time) pair (windows in the input order, cells sorted within a window)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+from func.part_of_day import part_of_day_array
+from func.count_cube import BUCKETS_PER_DAY, DAY_NS, to_epoch_ns
+from func.h3_index import h3_to_str
+
+# Buckets in one hour and in one week
+HOUR_BUCKETS = 6
+WEEK_BUCKETS = 7 * BUCKETS_PER_DAY
+
+# Number of windows processed together (bounds the memory of the (window x cell) arrays)
+CHUNK_SIZE = 1440
+
+
+def _window_features(cube, select_date_times):
+    """
+    Computes all features of collect_data for the given window starts as (window x cell) arrays.
+    """
+    t_ns = to_epoch_ns(select_date_times)
+    t = cube.bucket_of(t_ns)
+    year_back = cube.bucket_of(to_epoch_ns([x - relativedelta(months = 12) for x in select_date_times]))
+
+    features = dict()
+
+    # Count of the started trips in the previous windows
+    # (prev_2/prev_3 are left-joined to the cells of prev_1 in collect_data, so they are 0 where prev_1 is 0)
+    features['prev_1_hour_cnt'] = cube.range_counts(t - HOUR_BUCKETS, t)
+    has_prev_1 = features['prev_1_hour_cnt'] > 0
+    features['prev_2_hour_cnt'] = np.where(has_prev_1, cube.range_counts(t - 2 * HOUR_BUCKETS, t - HOUR_BUCKETS), 0)
+    features['prev_3_hour_cnt'] = np.where(has_prev_1, cube.range_counts(t - 3 * HOUR_BUCKETS, t - 2 * HOUR_BUCKETS), 0)
+
+    # Popularity of the h3 cell during last month/30 days and last week/7 days (count / max count),
+    # computed once per day from the daily counts and shared by all windows of the day
+    features.update(cube.daily.popularity(t_ns // DAY_NS, cells = cube.cells))
+
+    # Moving average for the same day of week during the last seven weeks.
+    # Window k covers [T - k weeks, T - k weeks + 1 hour] (right end included) and is grouped by date,
+    # so a window crossing midnight gives two groups: part A (date of T - k weeks) and part B (next date).
+    time_of_day = t % BUCKETS_PER_DAY
+    first_len = np.minimum(HOUR_BUCKETS, BUCKETS_PER_DAY - time_of_day)
+    end_in_part_a = (time_of_day + HOUR_BUCKETS) < BUCKETS_PER_DAY
+    part_a, part_b = dict(), dict()
+    for k in range(1, 8):
+        s = t - k * WEEK_BUCKETS
+        edge = cube.edge_counts(s + HOUR_BUCKETS)
+        part_a[k] = cube.range_counts(s, s + first_len) + np.where(end_in_part_a[:, None], edge, 0)
+        part_b[k] = cube.range_counts(s + first_len, s + HOUR_BUCKETS) + np.where(end_in_part_a[:, None], 0, edge)
+    # Step s uses the dates from (T - (s + 3) weeks) to (T - s weeks): parts A of k = s..s+3 and parts B of k = s+1..s+3;
+    # the average is taken over the (cell, date) groups with at least one trip
+    for step in [1, 2, 3, 4]:
+        groups = [part_a[k] for k in range(step, step + 4)] + [part_b[k] for k in range(step + 1, step + 4)]
+        total = np.sum(groups, axis=0)
+        n_groups = np.sum([group > 0 for group in groups], axis=0)
+        features['{}_weeks_back_moving_avg'.format(step)] = np.divide(total, n_groups, out=np.zeros(total.shape), where=n_groups > 0)
+    in_moving_avg = np.any([part_a[k] > 0 for k in range(1, 8)] + [part_b[k] > 0 for k in range(2, 8)], axis=0)
+
+    # Trips count one year ago
+    features['trip_count_1_year_back'] = cube.range_counts(year_back, year_back + HOUR_BUCKETS)
+
+    # Statuses (trips in the prediction window)
+    features['trip_count'] = cube.range_counts(t, t + HOUR_BUCKETS)
+
+    # Rows of collect_data: cells with trips in the previous hour or in any moving average group
+    selected = has_prev_1 | in_moving_avg
+    return features, selected
+
+
+def feature_history_ranges(select_date_time, data_type = 'score'):
+    """
+    Returns the time ranges of the trip history read by the features of one window (see _window_features),
+    so that only these trips have to be loaded.
+
+    Parameters:
+        select_date_time (datetime): Window start (UTC, floored to 10 minutes).
+        data_type (str): 'train' also needs the prediction window itself (trip_count); 'score' does not.
+
+    Returns:
+        list: Sorted, non-overlapping (start, end) pairs of UTC datetimes (end excluded).
+    """
+    day = datetime.combine(select_date_time.date(), datetime.min.time(), tzinfo=timezone.utc)
+    # Previous hours, popularity (last month/week) and moving averages (last seven weeks)
+    recent_start = min(
+        select_date_time - timedelta(hours = 3),
+        day - relativedelta(months = 1),
+        day - timedelta(days = 7),
+        select_date_time - timedelta(weeks = 7)
+    )
+    recent_end = select_date_time if data_type == 'score' else select_date_time + timedelta(hours = 1)
+    year_back = select_date_time - relativedelta(months = 12)
+
+    return merge_time_ranges([(year_back, year_back + timedelta(hours = 1)), (recent_start, recent_end)])
+
+
+def merge_time_ranges(ranges):
+    """
+    Merges overlapping or touching (start, end) ranges.
+
+    Parameters:
+        ranges (list): (start, end) pairs of datetimes.
+
+    Returns:
+        list: Sorted, non-overlapping (start, end) pairs.
+    """
+    merged = list()
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def collect_data_batch(
+    cube,                 # TripCountCube built from the filtered historical dataframe
+    check_date_list,      # e.g., ["2025-05-01", "2025-05-02"]
+    check_time_list,      # e.g., ["14:02:00", "14:12:00"]
+    data_type = 'train',  # 'train' or 'score'
+    output_folder = None  # if set, saves one parquet per window like collect_data (aka temp train data)
+):
+    """
+    Collects the features of every (date, time) window at once.
+
+    Parameters:
+        cube (TripCountCube): Bucketed trip counts of the historical data.
+        check_date_list (list): Dates as strings ('%Y-%m-%d').
+        check_time_list (list): Times as strings ('%H:%M:%S').
+        data_type (str): 'train' (adds the actual trip_count) or 'score'.
+        output_folder (str): Optional folder for per-window parquet files.
+
+    Returns:
+        pd.DataFrame: Features of all windows.
+    """
+    date_time_format = "%Y-%m-%d %H:%M:%S"
+    select_date_times = list()
+    for check_date_str in check_date_list:
+        for check_time_str in check_time_list:
+            check_date_time = datetime.strptime(check_date_str + ' ' + check_time_str, date_time_format).replace(tzinfo=timezone.utc)
+            floored_minute = (check_date_time.minute // 10) * 10
+            select_date_times.append(check_date_time.replace(minute=floored_minute, second=0, microsecond=0))
+
+    # h3 strings are produced only here, at the output boundary
+    cells_str = h3_to_str(cube.cells)
+
+    df_collect_list = list()
+    for chunk_start in range(0, len(select_date_times), CHUNK_SIZE):
+        chunk = select_date_times[chunk_start:chunk_start + CHUNK_SIZE]
+        features, selected = _window_features(cube, chunk)
+        window_idx, cell_idx = np.nonzero(selected)
+
+        select_date_time = pd.DatetimeIndex(chunk)[window_idx]
+        id_timestamp = np.array([
+            '{}_{}'.format(str(x.date()).replace('-', '_'), str(x.time()).replace(':', '_')) for x in chunk
+        ], dtype=object)[window_idx]
+        window_part_of_day = part_of_day_array(chunk)[window_idx]
+
+        df_chunk = pd.DataFrame({
+            'h3_cell': cells_str[cell_idx],
+            'prev_1_hour_cnt': features['prev_1_hour_cnt'][window_idx, cell_idx].astype(float),
+            'id_timestamp': id_timestamp,
+            'prev_2_hour_cnt': features['prev_2_hour_cnt'][window_idx, cell_idx].astype(float),
+            'prev_3_hour_cnt': features['prev_3_hour_cnt'][window_idx, cell_idx].astype(float),
+            '1_weeks_back_moving_avg': features['1_weeks_back_moving_avg'][window_idx, cell_idx],
+            '2_weeks_back_moving_avg': features['2_weeks_back_moving_avg'][window_idx, cell_idx],
+            '3_weeks_back_moving_avg': features['3_weeks_back_moving_avg'][window_idx, cell_idx],
+            '4_weeks_back_moving_avg': features['4_weeks_back_moving_avg'][window_idx, cell_idx],
+            'h3_cell_1_month_popularity': features['h3_cell_1_month_popularity'][window_idx, cell_idx],
+            'h3_cell_1_week_popularity': features['h3_cell_1_week_popularity'][window_idx, cell_idx],
+            'trip_count_1_year_back': features['trip_count_1_year_back'][window_idx, cell_idx].astype(float),
+            'prediction_date_time_start': select_date_time,
+            'prediction_date_time_end': select_date_time + timedelta(hours = 1),
+            # collect_data compares the timestamps (not the day of week) with [5, 6], so both flags are always 0;
+            # they are recomputed in "Feature engineering (2)"
+            'is_weekend': 0,
+            'is_sunday': 0,
+            'part_of_day': window_part_of_day,
+        })
+        if data_type != 'score':
+            trip_count = features['trip_count'][window_idx, cell_idx].astype(float)
+            df_chunk['trip_count'] = np.where(trip_count > 0, trip_count, np.nan)
+        df_collect_list.append(df_chunk)
+        print("[OK] Collected {} windows out of {}".format(chunk_start + len(chunk), len(select_date_times)))
+
+    df_collect_all = pd.concat(df_collect_list, ignore_index = True) if df_collect_list else pd.DataFrame()
+
+    if output_folder is not None:
+        for id_timestamp, df_window in df_collect_all.groupby('id_timestamp', sort = False):
+            df_window.reset_index(drop = True).to_parquet(
+                os.path.join(output_folder, '{}_{}.parquet'.format(data_type, id_timestamp))
+            )
+
+    return df_collect_all
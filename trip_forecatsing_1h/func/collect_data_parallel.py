@@ -0,0 +1,86 @@
+"""
+collect_data_parallel.py
+
+This module runs collect_data_batch in parallel worker processes.
+The dates are split into contiguous shards; every worker opens the persistent count cube memory-mapped
+(func/count_cube.py), so the trip history is shared through the page cache instead of being pickled.
+
+Input:
+    - cube_dir: folder of the saved count cube (see update_count_cube)
+    - check_date_list, check_time_list, data_type, output_folder: as in collect_data_batch
+    - n_workers: number of worker processes (1 = run in the current process)
+
+Output:
+    - DataFrames identical to collect_data_batch, one per shard of consecutive dates, in the input order
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+from func.count_cube import load_count_cube
+from func.collect_data_batch import collect_data_batch
+
+# Shards per worker (more shards = better load balancing)
+SHARDS_PER_WORKER = 4
+
+# Cube of the worker process (opened once by the initializer)
+_worker_cube = None
+
+
+def _init_worker(cube_dir):
+    global _worker_cube
+    _worker_cube = load_count_cube(cube_dir)
+
+
+def _collect_shard(args):
+    check_date_list, check_time_list, data_type, output_folder = args
+    return collect_data_batch(_worker_cube, check_date_list, check_time_list, data_type, output_folder)
+
+
+def iter_collect_data_parallel(
+    cube_dir,             # folder of the saved count cube
+    check_date_list,      # e.g., ["2025-05-01", "2025-05-02"]
+    check_time_list,      # e.g., ["14:02:00", "14:12:00"]
+    data_type = 'train',  # 'train' or 'score'
+    n_workers = 1,        # number of worker processes
+    output_folder = None  # if set, every worker saves its per-window parquet files
+):
+    """
+    Collects the features of every (date, time) window with a pool of worker processes.
+    Yields one DataFrame per shard of consecutive dates, in the input order.
+
+    Parameters:
+        cube_dir (str): Folder of the saved count cube.
+        check_date_list (list): Dates as strings ('%Y-%m-%d').
+        check_time_list (list): Times as strings ('%H:%M:%S').
+        data_type (str): 'train' or 'score'.
+        n_workers (int): Number of worker processes.
+        output_folder (str): Optional folder for per-window parquet files.
+
+    Yields:
+        pd.DataFrame: Features of the windows of one shard.
+    """
+    # Workers are forked (the scripts have no __main__ guard, so spawned workers would re-run them)
+    if 'fork' not in multiprocessing.get_all_start_methods() and n_workers > 1:
+        print("⚠️ 'fork' start method is not available, collecting in a single process")
+        n_workers = 1
+
+    if n_workers <= 1 or len(check_date_list) <= 1:
+        yield collect_data_batch(load_count_cube(cube_dir), check_date_list, check_time_list, data_type, output_folder)
+        return
+
+    shard_size = max(1, ceil(len(check_date_list) / (n_workers * SHARDS_PER_WORKER)))
+    shards = [
+        (check_date_list[i:i + shard_size], check_time_list, data_type, output_folder)
+        for i in range(0, len(check_date_list), shard_size)
+    ]
+    print("Collecting {} dates in {} shards with {} workers...".format(len(check_date_list), len(shards), n_workers))
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+        initargs=(cube_dir,)
+    ) as executor:
+        # map keeps the order of the shards -> deterministic output
+        for df_collect in executor.map(_collect_shard, shards):
+            yield df_collect
@@ -0,0 +1,573 @@
+"""
+count_cube.py
+
+This module provides the pre-bucketed trip count structure used by the batched feature engine.
+Every trip is assigned to its h3 cell and to a 10-minute time bucket (UTC, aligned to midnight).
+
+Structure:
+    - cells:  sorted array of uint64 h3 indexes (columns of the cube)
+    - cum:    cumulative trip counts along time, shape (n_buckets + 1, n_cells);
+              the number of trips of every cell in buckets [a, b) is cum[b] - cum[a]
+    - edge_*: trips that started exactly on a bucket boundary (e.g. 14:00:00.000),
+              needed for the windows of collect_data that include their right end
+
+The cube can be saved to a folder (next to the data folder) and loaded back memory-mapped,
+so the training runs reuse it without rebuilding it from the raw trips.
+Every save writes a new version folder (<cube_dir>/versions/<version>/) and switches <cube_dir>/CURRENT to it
+with os.replace, so a saved version is never rewritten while it is memory-mapped.
+A CompositeCountCube combines the cubes of a few disjoint time ranges (e.g. the history needed to score one window).
+Every cube also exposes its daily per-cell counts (DailyCellCounts, `cube.daily`), from which the popularity features
+are computed once per day and shared by all windows of the day.
+
+Requirements:
+    - Data must contain the columns 'start_date_full' (UTC datetime) and 'h3_index' (uint64, see func/h3_index.py)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+
+BUCKET_MINUTES = 10
+BUCKET_NS = BUCKET_MINUTES * 60 * 10**9
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+DAY_NS = BUCKETS_PER_DAY * BUCKET_NS
+# Day ordinals are days since this date (UTC)
+DAY_ORIGIN = date(1970, 1, 1)
+# Saved cube versions kept in the cube folder (older ones are removed, the current one is always kept)
+CUBE_KEEP_VERSIONS = 2
+
+
+def to_epoch_ns(values):
+    """
+    Converts UTC datetimes (Series, DatetimeIndex, list of datetimes or a single datetime) to int64 nanoseconds since epoch.
+
+    Parameters:
+        values: UTC datetime(s).
+
+    Returns:
+        np.ndarray or int: Nanoseconds since 1970-01-01 00:00:00 UTC.
+    """
+    if isinstance(values, datetime):
+        return pd.Timestamp(values).as_unit('ns').value
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+class TripCountCube:
+    """
+    Trip counts per (10-minute bucket x h3 cell) with cumulative sums along time.
+
+    Parameters:
+        cells (np.ndarray): Sorted uint64 h3 indexes.
+        origin_ns (int): Start of the first bucket (UTC midnight) in nanoseconds since epoch.
+        cum (np.ndarray): Cumulative counts, shape (n_buckets + 1, n_cells).
+        edge_bucket (np.ndarray): Bucket index of every boundary group (sorted).
+        edge_cell (np.ndarray): Cell position of every boundary group.
+        edge_count (np.ndarray): Number of trips that started exactly at the start of edge_bucket.
+        fingerprint (str): Hash of the trips the cube was built from.
+    """
+
+    def __init__(self, cells, origin_ns, cum, edge_bucket, edge_cell, edge_count, fingerprint = None):
+        self.cells = cells
+        self.origin_ns = int(origin_ns)
+        self.cum = cum
+        self.edge_bucket = edge_bucket
+        self.edge_cell = edge_cell
+        self.edge_count = edge_count
+        self.fingerprint = fingerprint
+        self._daily = None
+
+    @property
+    def n_cells(self):
+        return self.cum.shape[1]
+
+    @property
+    def n_buckets(self):
+        return self.cum.shape[0] - 1
+
+    @property
+    def daily(self):
+        """Daily counts per cell (DailyCellCounts), derived from the cube on first use."""
+        if self._daily is None:
+            self._daily = DailyCellCounts.from_cube(self)
+        return self._daily
+
+    def bucket_of(self, date_time_ns):
+        """
+        Returns the bucket index of the 10-minute bucket starting at date_time_ns (may be outside the cube).
+        """
+        return (np.asarray(date_time_ns, dtype=np.int64) - self.origin_ns) // BUCKET_NS
+
+    def range_counts(self, start_bucket, end_bucket):
+        """
+        Counts trips per cell in the buckets [start_bucket, end_bucket) for every window.
+
+        Parameters:
+            start_bucket (np.ndarray): Window starts (bucket index), shape (n_windows,).
+            end_bucket (np.ndarray): Window ends (bucket index, exclusive), shape (n_windows,).
+
+        Returns:
+            np.ndarray: Trip counts, shape (n_windows, n_cells).
+        """
+        start_bucket = np.clip(start_bucket, 0, self.n_buckets)
+        end_bucket = np.clip(end_bucket, 0, self.n_buckets)
+        return self.cum[end_bucket].astype(np.int64) - self.cum[start_bucket]
+
+    def edge_counts(self, bucket):
+        """
+        Counts trips per cell that started exactly at the start of the given bucket.
+
+        Parameters:
+            bucket (np.ndarray): Bucket index for every window, shape (n_windows,).
+
+        Returns:
+            np.ndarray: Trip counts, shape (n_windows, n_cells).
+        """
+        bucket = np.asarray(bucket, dtype=np.int64)
+        result = np.zeros((bucket.shape[0], self.n_cells), dtype=np.int64)
+        lo = np.searchsorted(self.edge_bucket, bucket, side='left')
+        hi = np.searchsorted(self.edge_bucket, bucket, side='right')
+        n_matches = hi - lo
+        if n_matches.sum() == 0:
+            return result
+        window_idx = np.repeat(np.arange(bucket.shape[0]), n_matches)
+        offsets = np.arange(n_matches.sum()) - np.repeat(np.cumsum(n_matches) - n_matches, n_matches)
+        edge_idx = np.repeat(lo, n_matches) + offsets
+        result[window_idx, self.edge_cell[edge_idx]] = self.edge_count[edge_idx]
+        return result
+
+
+class DailyCellCounts:
+    """
+    Trip counts per (day x h3 cell), maintained incrementally as trips arrive.
+    Days are day ordinals (days since 1970-01-01, UTC); a rolling sum over whole days is a difference
+    of two rows of the cumulative counts (rebuilt lazily after new trips).
+
+    The 1-month and 1-week popularity of a day depend only on the days before it, so they are computed once
+    per day and cached; the cache of a day is dropped when trips of an earlier day (or new cells) arrive.
+
+    Parameters:
+        cells (np.ndarray): Sorted uint64 h3 indexes.
+        first_day (int): Day ordinal of the first row.
+        counts (np.ndarray): Trip counts, shape (n_days, n_cells).
+    """
+
+    def __init__(self, cells = None, first_day = 0, counts = None):
+        self.cells = np.zeros(0, dtype=np.uint64) if cells is None else np.asarray(cells, dtype=np.uint64)
+        self.first_day = int(first_day)
+        self.counts = np.zeros((0, self.cells.shape[0]), dtype=np.int32) if counts is None else counts
+        self._cum = None
+        self._popularity = dict()
+
+    @classmethod
+    def from_cube(cls, cube):
+        """
+        Daily counts of a TripCountCube (its buckets cover whole days from a UTC midnight).
+        """
+        day_cum = cube.cum[::BUCKETS_PER_DAY]
+        return cls(cube.cells, cube.origin_ns // DAY_NS, np.diff(day_cum, axis=0).astype(np.int32))
+
+    @property
+    def n_cells(self):
+        return self.cells.shape[0]
+
+    @property
+    def n_days(self):
+        return self.counts.shape[0]
+
+    def add_counts(self, first_day, cells, counts):
+        """
+        Adds a block of daily counts (new cells and days are added as needed).
+
+        Parameters:
+            first_day (int): Day ordinal of the first row of the block.
+            cells (np.ndarray): Sorted uint64 h3 indexes of the block columns.
+            counts (np.ndarray): Trip counts, shape (n_block_days, len(cells)).
+        """
+        cells = np.asarray(cells, dtype=np.uint64)
+        if counts.shape[0] == 0 or cells.shape[0] == 0:
+            return
+        first_day = int(first_day)
+
+        # New cells: insert columns keeping the cells sorted
+        new_cells = np.setdiff1d(cells, self.cells)
+        if new_cells.shape[0] > 0:
+            all_cells = np.union1d(self.cells, new_cells)
+            grown = np.zeros((self.n_days, all_cells.shape[0]), dtype=np.int32)
+            grown[:, np.searchsorted(all_cells, self.cells)] = self.counts
+            self.cells, self.counts = all_cells, grown
+            self._popularity.clear()
+
+        # New days before or after the current rows
+        if self.n_days == 0:
+            self.first_day = first_day
+        start_day = min(self.first_day, first_day)
+        end_day = max(self.first_day + self.n_days, first_day + counts.shape[0])
+        if start_day != self.first_day or end_day != self.first_day + self.n_days:
+            grown = np.zeros((end_day - start_day, self.n_cells), dtype=np.int32)
+            grown[self.first_day - start_day:self.first_day - start_day + self.n_days] = self.counts
+            self.first_day, self.counts = start_day, grown
+
+        rows = slice(first_day - self.first_day, first_day - self.first_day + counts.shape[0])
+        self.counts[rows, np.searchsorted(self.cells, cells)] += counts.astype(np.int32)
+        self._cum = None
+        for day in [day for day in self._popularity if day > first_day]:
+            del self._popularity[day]
+
+    def add_trips(self, start_ns, h3_index):
+        """
+        Adds trips to the daily counts.
+
+        Parameters:
+            start_ns (np.ndarray): Trip starts in nanoseconds since epoch (UTC).
+            h3_index (np.ndarray): uint64 h3 indexes of the trips.
+        """
+        start_ns = np.asarray(start_ns, dtype=np.int64)
+        if start_ns.shape[0] == 0:
+            return
+        day = start_ns // DAY_NS
+        cells, cell_idx = np.unique(np.asarray(h3_index, dtype=np.uint64), return_inverse=True)
+        first_day = int(day.min())
+        n_days = int(day.max()) - first_day + 1
+        counts = np.bincount((day - first_day) * len(cells) + cell_idx.reshape(-1), minlength=n_days * len(cells))
+        self.add_counts(first_day, cells, counts.reshape(n_days, len(cells)))
+
+    def drop_days_before(self, day):
+        """
+        Removes the rows of the days before the given day ordinal (rolling sums over them are no longer available).
+        """
+        n_drop = min(max(int(day) - self.first_day, 0), self.n_days)
+        if n_drop == 0:
+            return
+        self.counts = self.counts[n_drop:].copy()
+        self.first_day += n_drop
+        self._cum = None
+        for cached_day in [cached_day for cached_day in self._popularity if cached_day < self.first_day]:
+            del self._popularity[cached_day]
+
+    def day_range_counts(self, start_days, end_days):
+        """
+        Counts trips per cell in the days [start_day, end_day) for every pair (days outside the table count 0).
+
+        Parameters:
+            start_days (np.ndarray): Range starts (day ordinals), shape (n_ranges,).
+            end_days (np.ndarray): Range ends (day ordinals, exclusive), shape (n_ranges,).
+
+        Returns:
+            np.ndarray: Trip counts, shape (n_ranges, n_cells).
+        """
+        if self._cum is None:
+            self._cum = np.zeros((self.n_days + 1, self.n_cells), dtype=np.int64)
+            np.cumsum(self.counts, axis=0, out=self._cum[1:])
+        start = np.clip(np.asarray(start_days, dtype=np.int64) - self.first_day, 0, self.n_days)
+        end = np.clip(np.asarray(end_days, dtype=np.int64) - self.first_day, 0, self.n_days)
+        return self._cum[np.maximum(start, end)] - self._cum[start]
+
+    def popularity(self, days, cells = None):
+        """
+        Computes the popularity features of collect_data: trips of every cell in [day - 1 month, day)
+        (resp. [day - 7 days, day)) divided by the maximum over the cells.
+        Every distinct day is computed once (and cached), then shared by all its windows.
+
+        Parameters:
+            days (np.ndarray): Day ordinal of every window, shape (n_windows,).
+            cells (np.ndarray): Sorted uint64 h3 indexes of the output columns (default: the cells of the table).
+
+        Returns:
+            dict: 'h3_cell_1_month_popularity' and 'h3_cell_1_week_popularity' -> arrays, shape (n_windows, n_cells).
+        """
+        unique_days, day_idx = np.unique(np.asarray(days, dtype=np.int64), return_inverse=True)
+        missing = np.array([day for day in unique_days.tolist() if day not in self._popularity], dtype=np.int64)
+        if missing.shape[0] > 0:
+            month_back = np.array([
+                (DAY_ORIGIN + timedelta(days = day) - relativedelta(months = 1) - DAY_ORIGIN).days for day in missing.tolist()
+            ], dtype=np.int64)
+            popularity = list()
+            for start_days in [month_back, missing - 7]:
+                counts = self.day_range_counts(start_days, missing)
+                max_counts = counts.max(axis=1, keepdims=True) if self.n_cells > 0 else np.zeros((counts.shape[0], 1))
+                popularity.append(np.divide(counts, max_counts, out=np.zeros(counts.shape), where=max_counts > 0))
+            for i, day in enumerate(missing.tolist()):
+                self._popularity[day] = (popularity[0][i], popularity[1][i])
+
+        if cells is not None:
+            cells = np.asarray(cells, dtype=np.uint64)
+            positions = np.searchsorted(self.cells, cells)
+            found = positions < self.n_cells
+            found[found] = self.cells[positions[found]] == cells[found]
+
+        result = dict()
+        for k, name in enumerate(['h3_cell_1_month_popularity', 'h3_cell_1_week_popularity']):
+            per_day = np.zeros((unique_days.shape[0], self.n_cells))
+            for i, day in enumerate(unique_days.tolist()):
+                per_day[i] = self._popularity[day][k]
+            if cells is not None:
+                # Columns of the requested cells (cells without daily counts -> 0)
+                aligned = np.zeros((unique_days.shape[0], cells.shape[0]))
+                aligned[:, found] = per_day[:, positions[found]]
+                per_day = aligned
+            result[name] = per_day[day_idx.reshape(-1)]
+        return result
+
+
+def trips_fingerprint(df_original_sel):
+    """
+    Computes a hash of the trips (start times and h3 cells) used to decide whether a saved cube is up to date.
+
+    Parameters:
+        df_original_sel (pd.DataFrame): Trips with 'start_date_full' (UTC) and 'h3_index'.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(to_epoch_ns(df_original_sel['start_date_full'])).tobytes())
+    digest.update(np.ascontiguousarray(df_original_sel['h3_index'].to_numpy(dtype=np.uint64)).tobytes())
+    return digest.hexdigest()
+
+
+def build_count_cube(df_original_sel):
+    """
+    Builds a TripCountCube from the trip history.
+
+    Parameters:
+        df_original_sel (pd.DataFrame): Trips with 'start_date_full' (UTC) and 'h3_index'.
+
+    Returns:
+        TripCountCube: Cube covering every day from the first to the last trip.
+    """
+    start_ns = to_epoch_ns(df_original_sel['start_date_full'])
+    cells, cell_idx = np.unique(df_original_sel['h3_index'].to_numpy(dtype=np.uint64), return_inverse=True)
+    cell_idx = cell_idx.reshape(-1)
+
+    if start_ns.shape[0] == 0:
+        origin_ns, n_buckets = 0, 0
+    else:
+        origin_ns = (start_ns.min() // DAY_NS) * DAY_NS
+        n_buckets = int((start_ns.max() // DAY_NS) * DAY_NS - origin_ns) // BUCKET_NS + BUCKETS_PER_DAY
+    offset_ns = start_ns - origin_ns
+    bucket = offset_ns // BUCKET_NS
+
+    # Counts per bucket and cell -> cumulative sums along time
+    counts = np.bincount(bucket * len(cells) + cell_idx, minlength=n_buckets * len(cells)).reshape(n_buckets, len(cells))
+    cum = np.zeros((n_buckets + 1, len(cells)), dtype=np.int32)
+    np.cumsum(counts, axis=0, out=cum[1:])
+
+    # Trips exactly on a bucket boundary
+    is_edge = (offset_ns % BUCKET_NS) == 0
+    edge_keys, edge_count = np.unique(bucket[is_edge] * len(cells) + cell_idx[is_edge], return_counts=True)
+
+    return TripCountCube(
+        cells=cells,
+        origin_ns=origin_ns,
+        cum=cum,
+        edge_bucket=edge_keys // max(len(cells), 1),
+        edge_cell=edge_keys % max(len(cells), 1),
+        edge_count=edge_count,
+        fingerprint=trips_fingerprint(df_original_sel)
+    )
+
+
+class CompositeCountCube:
+    """
+    Several cubes built over disjoint time ranges, read as one cube (same interface as TripCountCube).
+    Used when only a few short ranges of the history are loaded (e.g. to score a single window).
+    Buckets are absolute 10-minute buckets since epoch (UTC).
+
+    Parameters:
+        cubes (list): TripCountCube objects over disjoint time ranges.
+    """
+
+    origin_ns = 0
+
+    def __init__(self, cubes):
+        self.cubes = cubes
+        self.cells = np.unique(np.concatenate([cube.cells for cube in cubes] + [np.zeros(0, dtype=np.uint64)]))
+        # Columns of every cube in the common (sorted) cells
+        self._positions = [np.searchsorted(self.cells, cube.cells) for cube in cubes]
+        self._daily = None
+
+    @property
+    def n_cells(self):
+        return self.cells.shape[0]
+
+    @property
+    def daily(self):
+        """Daily counts per cell (DailyCellCounts) of all cubes."""
+        if self._daily is None:
+            self._daily = DailyCellCounts()
+            for cube in self.cubes:
+                self._daily.add_counts(cube.daily.first_day, cube.cells, cube.daily.counts)
+        return self._daily
+
+    def bucket_of(self, date_time_ns):
+        return np.asarray(date_time_ns, dtype=np.int64) // BUCKET_NS
+
+    def range_counts(self, start_bucket, end_bucket):
+        """
+        Counts trips per cell in the buckets [start_bucket, end_bucket) for every window (sum over the cubes).
+        """
+        start_bucket = np.asarray(start_bucket, dtype=np.int64)
+        end_bucket = np.asarray(end_bucket, dtype=np.int64)
+        result = np.zeros((end_bucket.shape[0], self.n_cells), dtype=np.int64)
+        for cube, positions in zip(self.cubes, self._positions):
+            offset = cube.origin_ns // BUCKET_NS
+            result[:, positions] += cube.range_counts(start_bucket - offset, end_bucket - offset)
+        return result
+
+    def edge_counts(self, bucket):
+        """
+        Counts trips per cell that started exactly at the start of the given bucket (sum over the cubes).
+        """
+        bucket = np.asarray(bucket, dtype=np.int64)
+        result = np.zeros((bucket.shape[0], self.n_cells), dtype=np.int64)
+        for cube, positions in zip(self.cubes, self._positions):
+            result[:, positions] += cube.edge_counts(bucket - cube.origin_ns // BUCKET_NS)
+        return result
+
+
+def build_count_cube_ranges(history, ranges):
+    """
+    Builds one cube per time range and combines them, so the empty time between the ranges takes no memory.
+    The trips of every range are a binary-search slice of the time-indexed history.
+
+    Parameters:
+        history (TripHistory): Time-indexed trip history (func/trip_history.py).
+        ranges (list): Disjoint (start, end) pairs of UTC datetimes (end excluded).
+
+    Returns:
+        CompositeCountCube: Cube of the trips inside the ranges.
+    """
+    cubes = list()
+    for start, end in ranges:
+        cubes.append(build_count_cube(history.slice(start, end)))
+    return CompositeCountCube(cubes)
+
+
+def current_count_cube_version(cube_dir):
+    """
+    Reads the CURRENT pointer of the cube folder.
+
+    Parameters:
+        cube_dir (str): Folder of the persistent cube.
+
+    Returns:
+        str or None: Current version, None if no cube was saved yet.
+    """
+    current_path = os.path.join(cube_dir, 'CURRENT')
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def save_count_cube(cube, cube_dir):
+    """
+    Saves the cube as .npy files (loaded back memory-mapped) plus meta.json into a new version folder
+    (versions/<version>/, written under a temporary name and then renamed) and switches CURRENT to it with os.replace.
+    A saved version is never overwritten, so a process that still has an older version memory-mapped keeps reading it.
+    The oldest versions are removed (the last CUBE_KEEP_VERSIONS are kept).
+
+    Parameters:
+        cube (TripCountCube): The cube to save.
+        cube_dir (str): Folder of the persistent cube.
+
+    Returns:
+        str: Version of the saved cube.
+    """
+    versions_dir = os.path.join(cube_dir, 'versions')
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    tmp_dir = os.path.join(versions_dir, version + '.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    arrays = {
+        'cells': cube.cells,
+        'cum': cube.cum,
+        'edge_bucket': cube.edge_bucket,
+        'edge_cell': cube.edge_cell,
+        'edge_count': cube.edge_count
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, '{}.npy'.format(name)), np.ascontiguousarray(array))
+    meta = {
+        'origin_ns': cube.origin_ns,
+        'n_buckets': cube.n_buckets,
+        'n_cells': cube.n_cells,
+        'fingerprint': cube.fingerprint
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_dir, os.path.join(versions_dir, version))
+
+    tmp_path = os.path.join(cube_dir, 'CURRENT.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(cube_dir, 'CURRENT'))
+
+    # Drop the oldest versions (a version still memory-mapped elsewhere stays readable until it is closed)
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.endswith('.tmp'))
+    for old_version in versions[:max(0, len(versions) - CUBE_KEEP_VERSIONS)]:
+        if old_version != version:
+            shutil.rmtree(os.path.join(versions_dir, old_version), ignore_errors=True)
+    return version
+
+
+def load_count_cube(cube_dir):
+    """
+    Loads the current version of a saved cube; the cumulative counts are memory-mapped (read-only).
+
+    Parameters:
+        cube_dir (str): Folder of the persistent cube.
+
+    Returns:
+        TripCountCube or None: The cube, or None if there is no (complete) cube in the folder.
+    """
+    version = current_count_cube_version(cube_dir)
+    if version is None:
+        return None
+    version_dir = os.path.join(cube_dir, 'versions', version)
+    meta_path = os.path.join(version_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    cum = np.load(os.path.join(version_dir, 'cum.npy'), mmap_mode='r')
+    if cum.shape != (meta['n_buckets'] + 1, meta['n_cells']):
+        return None
+    return TripCountCube(
+        cells=np.load(os.path.join(version_dir, 'cells.npy')),
+        origin_ns=meta['origin_ns'],
+        cum=cum,
+        edge_bucket=np.load(os.path.join(version_dir, 'edge_bucket.npy')),
+        edge_cell=np.load(os.path.join(version_dir, 'edge_cell.npy')),
+        edge_count=np.load(os.path.join(version_dir, 'edge_count.npy')),
+        fingerprint=meta['fingerprint']
+    )
+
+
+def update_count_cube(df_original_sel, cube_dir):
+    """
+    Returns the memory-mapped cube of cube_dir, rebuilding and saving it first if it was built from other trips.
+
+    Parameters:
+        df_original_sel (pd.DataFrame): Trips with 'start_date_full' (UTC) and 'h3_index'.
+        cube_dir (str): Folder of the persistent cube.
+
+    Returns:
+        TripCountCube: Memory-mapped cube of df_original_sel.
+    """
+    cube = load_count_cube(cube_dir)
+    if cube is not None and cube.fingerprint == trips_fingerprint(df_original_sel):
+        print("[OK] Count cube in {} is up to date".format(cube_dir))
+        return cube
+    # Release the memory-mapped old version before the new one is saved
+    del cube
+    print("Building count cube in {}...".format(cube_dir))
+    save_count_cube(build_count_cube(df_original_sel), cube_dir)
+    return load_count_cube(cube_dir)
@@ -0,0 +1,72 @@
+"""
+feature_matrix.py
+
+This module turns the collected features (output of collect_data / collect_data_batch) into the model input.
+It replaces the "Feature engineering (2)" steps of the scripts (astype copies, get_dummies + concat, drop, reindex)
+with one contiguous float32 matrix filled column by column, so training and scoring build exactly the same input.
+
+Columns (in features_col order):
+    - numeric features: copied from the collected features (missing values -> 0)
+    - is_weekend: recomputed from prediction_date_time_start (the collected flag is always 0)
+    - part of day / day of week flags: one-hot, written in place (labels not in features_col are skipped)
+
+The matrix has no column names, so the scripts predict with the Booster (func/model_io.py)
+(LGBMRegressor.predict would warn that the model was fitted with feature names).
+"""
+
+import numpy as np
+
+
+def build_feature_matrix(df_all, features_col, part_of_day_labels, day_labels):
+    """
+    Builds the model input matrix.
+
+    Parameters:
+        df_all (pd.DataFrame): Collected features.
+        features_col (list): Model features (column order of the matrix).
+        part_of_day_labels (dict): part_of_day value -> flag column name.
+        day_labels (dict): day of week value (Monday = 0) -> flag column name.
+
+    Returns:
+        np.ndarray: float32 matrix, shape (n_rows, len(features_col)), C-contiguous.
+    """
+    n_rows = df_all.shape[0]
+    position = {name: i for i, name in enumerate(features_col)}
+    calendar_col = set(part_of_day_labels.values()) | set(day_labels.values()) | {'is_weekend'}
+    X = np.zeros((n_rows, len(features_col)), dtype=np.float32)
+    if n_rows == 0:
+        return X
+
+    # Numeric features
+    for name in features_col:
+        if name not in calendar_col:
+            X[:, position[name]] = df_all[name].to_numpy(dtype=np.float32, na_value=0)
+
+    # Calendar flags (one-hot in place)
+    day_of_week = df_all['prediction_date_time_start'].dt.dayofweek.to_numpy()
+    if 'is_weekend' in position:
+        X[:, position['is_weekend']] = (day_of_week >= 5)
+    rows = np.arange(n_rows)
+    for values, labels in [(df_all['part_of_day'].to_numpy(dtype=np.int64), part_of_day_labels), (day_of_week, day_labels)]:
+        # value -> matrix column (-1 = no column)
+        column_of = np.full(max(labels) + 1, -1, dtype=np.int64)
+        for value, label in labels.items():
+            column_of[value] = position.get(label, -1)
+        columns = column_of[values]
+        has_column = columns >= 0
+        X[rows[has_column], columns[has_column]] = 1
+    return X
+
+
+def build_target(df_all, target_col):
+    """
+    Builds the target vector (missing trip counts -> 0).
+
+    Parameters:
+        df_all (pd.DataFrame): Collected features with the target.
+        target_col (str): Target column.
+
+    Returns:
+        np.ndarray: float32 vector, shape (n_rows,).
+    """
+    return df_all[target_col].to_numpy(dtype=np.float32, na_value=0)
@@ -0,0 +1,183 @@
+"""
+feature_store.py
+
+This module provides a persistent store of the collected training windows, reused across retrains.
+The model is retrained on a trailing date_list, so most of the days were already collected in the previous run;
+only the days missing from the store are collected again (func/collect_data_parallel.py).
+
+Store layout:
+    - <store_dir>/version=<hash>/date=YYYY-MM-DD.parquet: all windows (id_timestamp) of one day
+    - <store_dir>/version=<hash>/manifest.json: number of rows of every stored day
+
+The version hash covers the source code of the feature modules, the h3 resolution, the list of window times and STORE_VERSION,
+so a change of the feature logic or of RESOLUTION starts a new (empty) version; older versions are removed.
+
+Only complete days are stored: the windows of a day need the trips up to one hour after the day,
+so the days on or after complete_until (the last day of the data, whose windows from 23:10 on would have cut targets)
+are collected on every run and never stored.
+The store assumes that past trips do not change; delete the store folder to rebuild it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from func.collect_data_parallel import iter_collect_data_parallel
+
+# Modules that define the features (a change in any of them invalidates the store)
+FEATURE_MODULES = ['collect_data.py', 'collect_data_batch.py', 'count_cube.py', 'part_of_day.py', 'season_of_year.py']
+# Bumped when the stored days must be collected again (2: the last day of the data is no longer stored)
+STORE_VERSION = 2
+
+
+def feature_version(resolution, check_time_list):
+    """
+    Computes the version hash of the feature definition.
+
+    Parameters:
+        resolution (int): h3 resolution.
+        check_time_list (list): Times of the windows ('%H:%M:%S').
+
+    Returns:
+        str: Version hash (12 hex characters).
+    """
+    h = hashlib.sha1()
+    func_dir = Path(__file__).resolve().parent
+    for module in FEATURE_MODULES:
+        h.update(module.encode('utf-8'))
+        h.update((func_dir / module).read_bytes())
+    h.update(json.dumps({'resolution': resolution, 'check_time_list': list(check_time_list), 'store_version': STORE_VERSION}).encode('utf-8'))
+    return h.hexdigest()[:12]
+
+
+def _version_dir(store_dir, version):
+    return os.path.join(store_dir, 'version={}'.format(version))
+
+
+def _read_manifest(version_dir):
+    manifest_path = os.path.join(version_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return dict()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(version_dir, manifest):
+    tmp_path = os.path.join(version_dir, 'manifest.tmp.json')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(version_dir, 'manifest.json'))
+
+
+def _day_path(version_dir, check_date_str):
+    return os.path.join(version_dir, 'date={}.parquet'.format(check_date_str))
+
+
+def dataset_cache_dir(store_dir, version):
+    """
+    Folder for the cached binned training data (func/train_dataset.py) of a version;
+    it is removed together with the version.
+    """
+    return _version_dir(store_dir, version)
+
+
+def update_feature_store(cube_dir, store_dir, version, check_date_list, check_time_list, complete_until, n_workers = 1):
+    """
+    Collects the days of check_date_list that are missing from the store (plus the incomplete days) and stores them.
+
+    Parameters:
+        cube_dir (str): Folder of the saved count cube.
+        store_dir (str): Folder of the feature store.
+        version (str): Version hash of the feature definition (see feature_version).
+        check_date_list (list): Dates as strings ('%Y-%m-%d').
+        check_time_list (list): Times as strings ('%H:%M:%S').
+        complete_until (str): First day that is not complete yet ('%Y-%m-%d'): the last day of the trip data
+            (its last windows need the trips of the next hour); it and later days are not kept.
+        n_workers (int): Number of worker processes.
+
+    Returns:
+        pd.DataFrame: Windows of the incomplete days (not stored).
+    """
+    version_dir = _version_dir(store_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+    # Drop the versions of an older feature definition
+    for name in os.listdir(store_dir):
+        if name.startswith('version=') and name != os.path.basename(version_dir):
+            print("Removing outdated feature version {}...".format(name))
+            shutil.rmtree(os.path.join(store_dir, name))
+
+    manifest = _read_manifest(version_dir)
+    missing_dates = [d for d in check_date_list if d not in manifest or d >= complete_until]
+    print("Feature store: {} of {} dates stored, collecting {}".format(
+        len(check_date_list) - len(missing_dates), len(check_date_list), len(missing_dates)
+    ))
+    if not missing_dates:
+        return pd.DataFrame()
+
+    df_incomplete_list = list()
+    for df_collect in iter_collect_data_parallel(cube_dir, missing_dates, check_time_list, 'train', n_workers):
+        if df_collect.shape[0] == 0:
+            continue
+        day_of_row = df_collect['prediction_date_time_start'].dt.strftime('%Y-%m-%d')
+        for check_date_str, df_day in df_collect.groupby(day_of_row, sort = False):
+            if check_date_str >= complete_until:
+                df_incomplete_list.append(df_day)
+                continue
+            tmp_path = os.path.join(version_dir, 'date={}.tmp.parquet'.format(check_date_str))
+            df_day.reset_index(drop = True).to_parquet(tmp_path, index = False)
+            os.replace(tmp_path, _day_path(version_dir, check_date_str))
+            manifest[check_date_str] = {'rows': int(df_day.shape[0])}
+        _write_manifest(version_dir, manifest)
+
+    # Complete days without any window
+    for check_date_str in missing_dates:
+        if check_date_str < complete_until and check_date_str not in manifest:
+            manifest[check_date_str] = {'rows': 0}
+    _write_manifest(version_dir, manifest)
+
+    if not df_incomplete_list:
+        return pd.DataFrame()
+    return pd.concat(df_incomplete_list, ignore_index = True)
+
+
+def stored_day_files(store_dir, version, check_date_list):
+    """
+    Lists the stored (non-empty) days of check_date_list, in its order.
+
+    Parameters:
+        store_dir (str): Folder of the feature store.
+        version (str): Version hash of the feature definition.
+        check_date_list (list): Dates as strings ('%Y-%m-%d').
+
+    Returns:
+        list: (parquet path, number of rows) of every stored day.
+    """
+    day_version_dir = _version_dir(store_dir, version)
+    manifest = _read_manifest(day_version_dir)
+    return [
+        (_day_path(day_version_dir, d), manifest[d]['rows']) for d in check_date_list
+        if d in manifest and manifest[d]['rows'] > 0
+    ]
+
+
+def read_feature_store(store_dir, version, check_date_list, columns = None):
+    """
+    Reads the stored windows of the given days with a single columnar read (in the order of check_date_list).
+
+    Parameters:
+        store_dir (str): Folder of the feature store.
+        version (str): Version hash of the feature definition.
+        check_date_list (list): Dates as strings ('%Y-%m-%d').
+        columns (list): Columns to read (default: all).
+
+    Returns:
+        pd.DataFrame: Windows of the stored days.
+    """
+    paths = [path for path, _ in stored_day_files(store_dir, version, check_date_list)]
+    if not paths:
+        return pd.DataFrame()
+    # partitioning=None: the version=<hash> folder is not a column
+    return pq.read_table(paths, columns = columns, partitioning = None).to_pandas()
@@ -0,0 +1,104 @@
+"""
+h3_index.py
+
+This module provides bulk h3 cell assignment for NumPy lat/lon arrays.
+Pickup points repeat heavily, so every distinct coordinate pair is indexed once and kept in a memo table
+(shared by all calls of the process); the rest of the rows reuse the memoized index.
+
+Cells are returned as compact uint64 h3 indexes; conversion to the usual h3 strings
+(e.g. '8754ac208ffffff') is done only at the output boundary with h3_to_str.
+h3_cell_geometry adds the cell centers and boundaries to the outputs used for maps.
+"""
+
+import numpy as np
+import pandas as pd
+import h3.api.basic_int as h3_int #current version is 3.7.6
+
+# Memo table: resolution -> {(lat, lon): h3 index}
+_coordinate_memo = dict()
+
+
+def geo_to_h3_array(lat, lon, resolution):
+    """
+    Assigns h3 cells to arrays of coordinates.
+
+    Parameters:
+        lat (np.ndarray): Latitudes.
+        lon (np.ndarray): Longitudes.
+        resolution (int): h3 resolution.
+
+    Returns:
+        np.ndarray: uint64 h3 indexes (same length as lat/lon).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if lat.shape[0] == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    # Distinct coordinate pairs (lat + 1j * lon is an exact encoding of the pair)
+    points, point_idx = np.unique(lat + 1j * lon, return_inverse=True)
+    memo = _coordinate_memo.setdefault(resolution, dict())
+    point_h3 = np.empty(points.shape[0], dtype=np.uint64)
+    for i, point in enumerate(points.tolist()):
+        key = (point.real, point.imag)
+        h3_index = memo.get(key)
+        if h3_index is None:
+            h3_index = h3_int.geo_to_h3(point.real, point.imag, resolution)
+            memo[key] = h3_index
+        point_h3[i] = h3_index
+    return point_h3[point_idx.reshape(-1)]
+
+
+def h3_to_str(h3_index):
+    """
+    Converts uint64 h3 indexes to h3 strings (each distinct index is converted once).
+
+    Parameters:
+        h3_index (np.ndarray): uint64 h3 indexes.
+
+    Returns:
+        np.ndarray: h3 strings (object dtype).
+    """
+    h3_index = np.asarray(h3_index, dtype=np.uint64)
+    cells, cell_idx = np.unique(h3_index, return_inverse=True)
+    cells_str = np.array([h3_int.h3_to_string(cell) for cell in cells.tolist()], dtype=object)
+    return cells_str[cell_idx.reshape(-1)]
+
+
+def str_to_h3(h3_cell):
+    """
+    Converts h3 strings to uint64 h3 indexes.
+
+    Parameters:
+        h3_cell (array-like): h3 strings.
+
+    Returns:
+        np.ndarray: uint64 h3 indexes.
+    """
+    cells, cell_idx = np.unique(np.asarray(h3_cell, dtype=str), return_inverse=True)
+    cells_int = np.array([h3_int.string_to_h3(cell) for cell in cells.tolist()], dtype=np.uint64)
+    return cells_int[cell_idx.reshape(-1)]
+
+
+def h3_cell_geometry(h3_cell):
+    """
+    Computes the center and the boundary of h3 cells (e.g. for maps).
+
+    Parameters:
+        h3_cell (array-like): h3 strings.
+
+    Returns:
+        pd.DataFrame: h3_cell, lat, lon (center) and boundary (closed list of [lon, lat] points, GeoJSON order),
+                      one row per distinct cell.
+    """
+    cells = np.unique(np.asarray(h3_cell, dtype=str)).tolist()
+    centers = [h3_int.h3_to_geo(h3_int.string_to_h3(cell)) for cell in cells]
+    boundaries = [
+        [list(point) for point in h3_int.h3_to_geo_boundary(h3_int.string_to_h3(cell), geo_json=True)] for cell in cells
+    ]
+    return pd.DataFrame({
+        'h3_cell': cells,
+        'lat': [center[0] for center in centers],
+        'lon': [center[1] for center in centers],
+        'boundary': boundaries
+    })
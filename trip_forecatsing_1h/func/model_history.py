@@ -0,0 +1,40 @@
+"""
+model_history.py
+
+This module looks up the previous training runs kept in the model folder
+(model_train_<date>_id/metrics_<date>.json, written by 01_train_model.py).
+"""
+
+import json
+import os
+import re
+
+RUN_FOLDER_PATTERN = re.compile(r'model_train_(\d{4}_\d{2}_\d{2})_id')
+
+
+def previous_model_run(model_dir, id_date):
+    """
+    Finds the latest training run before id_date.
+
+    Parameters:
+        model_dir (str): Model folder.
+        id_date (str): Date of the current run ('%Y-%m-%d').
+
+    Returns:
+        dict or None: Metrics of the previous run (incl. 'id_date' and 'model_file'), None if there is none.
+    """
+    if not os.path.isdir(model_dir):
+        return None
+    runs = list()
+    for name in os.listdir(model_dir):
+        match = RUN_FOLDER_PATTERN.fullmatch(name)
+        if match is None:
+            continue
+        run_date = match.group(1).replace('_', '-')
+        metrics_path = os.path.join(model_dir, name, 'metrics_{}.json'.format(match.group(1)))
+        if run_date < id_date and os.path.exists(metrics_path):
+            runs.append((run_date, metrics_path))
+    if not runs:
+        return None
+    with open(max(runs)[1], 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,129 @@
+"""
+model_io.py
+
+This module saves, publishes and loads the trained model.
+Models are kept in LightGBM's native text format and published through a small registry,
+so a scoring run never reads a half-written model:
+
+Registry layout:
+    - <registry_dir>/versions/<version>/model.txt: one published model (written under a temporary name, then renamed);
+      a version is never overwritten, every publish needs a new version name
+    - <registry_dir>/CURRENT: name of the version to score with (replaced atomically with os.replace)
+
+A published model is loaded back (and timed) before CURRENT is switched to it.
+Older runs saved the fitted LGBMRegressor / Booster as .pkl; load_model still reads them (unwrapped to the Booster).
+"""
+
+import os
+import shutil
+import joblib
+import lightgbm as lgb
+from time import perf_counter
+
+# Published versions kept in the registry (older ones are removed, the current one is always kept)
+KEEP_VERSIONS = 5
+
+
+def save_model(booster, model_path):
+    """
+    Saves a Booster in the native text format (atomically: temporary file, then os.replace).
+
+    Parameters:
+        booster (lgb.Booster): The model.
+        model_path (str): Path of the .txt file.
+    """
+    tmp_path = model_path + '.tmp'
+    booster.save_model(tmp_path)
+    os.replace(tmp_path, model_path)
+
+
+def load_model(model_path):
+    """
+    Loads a saved model.
+
+    Parameters:
+        model_path (str): Path of the native .txt file or of an older .pkl file (lgb.Booster or LGBMRegressor).
+
+    Returns:
+        lgb.Booster: The model.
+    """
+    if model_path.endswith('.txt'):
+        return lgb.Booster(model_file = model_path)
+    model = joblib.load(model_path)
+    if isinstance(model, lgb.LGBMModel):
+        return model.booster_
+    return model
+
+
+def current_model_version(registry_dir):
+    """
+    Reads the CURRENT pointer of the registry.
+
+    Parameters:
+        registry_dir (str): Folder of the registry.
+
+    Returns:
+        str or None: Current version, None if nothing was published yet.
+    """
+    current_path = os.path.join(registry_dir, 'CURRENT')
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def load_current_model(registry_dir, version = None):
+    """
+    Loads the current (or the given) model version of the registry.
+
+    Parameters:
+        registry_dir (str): Folder of the registry.
+        version (str): Version to load (default: the CURRENT one).
+
+    Returns:
+        tuple: (version, lgb.Booster, load time in ms), or (None, None, None) if nothing was published yet.
+    """
+    if version is None:
+        version = current_model_version(registry_dir)
+    if version is None:
+        return None, None, None
+    start = perf_counter()
+    booster = load_model(os.path.join(registry_dir, 'versions', version, 'model.txt'))
+    return version, booster, 1000 * (perf_counter() - start)
+
+
+def publish_model(registry_dir, booster, version):
+    """
+    Publishes a model: writes it into versions/<version>/, loads it back and switches CURRENT to it.
+
+    Parameters:
+        registry_dir (str): Folder of the registry.
+        booster (lgb.Booster): The model.
+        version (str): New version name (e.g. the id date and the time of the training run).
+
+    Returns:
+        float: Load time of the published model in ms.
+    """
+    version_dir = os.path.join(registry_dir, 'versions', version)
+    if os.path.exists(version_dir):
+        raise ValueError("Model version {} is already published".format(version))
+    os.makedirs(version_dir, exist_ok=True)
+    model_path = os.path.join(version_dir, 'model.txt')
+    save_model(booster, model_path)
+
+    # The model must load before it becomes current
+    start = perf_counter()
+    load_model(model_path)
+    load_ms = 1000 * (perf_counter() - start)
+
+    tmp_path = os.path.join(registry_dir, 'CURRENT.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(registry_dir, 'CURRENT'))
+
+    # Drop the oldest versions
+    versions = sorted(os.listdir(os.path.join(registry_dir, 'versions')))
+    for old_version in versions[:max(0, len(versions) - KEEP_VERSIONS)]:
+        if old_version != version:
+            shutil.rmtree(os.path.join(registry_dir, 'versions', old_version))
+    return load_ms
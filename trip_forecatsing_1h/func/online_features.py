@@ -0,0 +1,255 @@
+"""
+online_features.py
+
+This module provides an online (streaming) feature state for real-time scoring.
+Incoming trips are added in batches with array operations (no Python work per trip); the features of the
+current window are then read from the state without touching the historical raw data.
+
+State (per h3 cell):
+    - slot counts: dense ring of 10-minute bucket counts over the last RECENT_RING_DAYS days
+      (last 3 hours and the same slot 1-7 weeks back, so every recent slot is read by some window)
+    - old slot counts: sparse (bucket, cell, count) entries of the older buckets up to SLOT_RING_DAYS back, sorted by bucket
+      (only the same hour one year back is read there, so only the non-zero counts are kept)
+    - edge counts: dense ring of the trips that started exactly on a bucket boundary over the last RECENT_RING_DAYS days
+      (the moving average windows of collect_data include their right end)
+    - daily counts: DailyCellCounts over the last DAILY_RING_DAYS days (1-week and 1-month popularity,
+      computed once per day and reused by every window of the day)
+
+The state has the same read interface as TripCountCube (cells, bucket_of, range_counts, edge_counts),
+so collect_data_batch produces the exact collect_data rows from it.
+"""
+
+import numpy as np
+from func.count_cube import BUCKET_NS, BUCKETS_PER_DAY, DailyCellCounts
+
+# State sizes (days)
+SLOT_RING_DAYS = 367     # one year back (366 days in a leap year) + one hour
+RECENT_RING_DAYS = 50    # seven weeks back + one hour
+DAILY_RING_DAYS = 40     # one month back
+
+SLOT_RING_BUCKETS = SLOT_RING_DAYS * BUCKETS_PER_DAY
+RECENT_RING_BUCKETS = RECENT_RING_DAYS * BUCKETS_PER_DAY
+
+
+class OnlineFeatureState:
+    """
+    Sliding-window trip counts per h3 cell, updated batch by batch.
+    Buckets are absolute 10-minute buckets since epoch (UTC), so bucket % BUCKETS_PER_DAY is the slot of the day.
+    """
+
+    origin_ns = 0
+
+    def __init__(self, capacity = 256):
+        self._cells = np.zeros(0, dtype=np.uint64)
+        self._sorted_columns = np.zeros(0, dtype=np.int64)
+        self.slot_counts = np.zeros((RECENT_RING_BUCKETS, capacity), dtype=np.int32)
+        self.edge_counts_ring = np.zeros((RECENT_RING_BUCKETS, capacity), dtype=np.int32)
+        # Old slot counts, sorted by bucket
+        self.old_bucket = np.zeros(0, dtype=np.int64)
+        self.old_column = np.zeros(0, dtype=np.int64)
+        self.old_count = np.zeros(0, dtype=np.int64)
+        self.daily = DailyCellCounts()
+        # Newest bucket seen so far (None = empty state)
+        self.head_bucket = None
+
+    @property
+    def cells(self):
+        """Sorted uint64 h3 indexes of the active cells."""
+        return self._cells[self._sorted_columns]
+
+    @property
+    def n_cells(self):
+        return self._cells.shape[0]
+
+    def bucket_of(self, date_time_ns):
+        return np.asarray(date_time_ns, dtype=np.int64) // BUCKET_NS
+
+    def _columns(self, h3_index):
+        """
+        Column of every trip; the new cells of a batch are registered at once (one re-sort, at most one ring growth).
+        """
+        cells, inverse = np.unique(h3_index, return_inverse=True)
+        sorted_cells = self.cells
+        position = np.searchsorted(sorted_cells, cells)
+        known = position < sorted_cells.shape[0]
+        known[known] = sorted_cells[position[known]] == cells[known]
+        new_cells = cells[~known]
+        if new_cells.shape[0] > 0:
+            n_cells = self.n_cells + new_cells.shape[0]
+            capacity = self.slot_counts.shape[1]
+            if n_cells > capacity:
+                capacity = max(2 * capacity, n_cells)
+                for name in ['slot_counts', 'edge_counts_ring']:
+                    ring = getattr(self, name)
+                    grown = np.zeros((ring.shape[0], capacity), dtype=np.int32)
+                    grown[:, :self.n_cells] = ring[:, :self.n_cells]
+                    setattr(self, name, grown)
+                    del ring
+            self._cells = np.concatenate([self._cells, new_cells])
+            self._sorted_columns = np.argsort(self._cells, kind='stable')
+            position = np.searchsorted(self.cells, cells)
+        return self._sorted_columns[position][inverse.reshape(-1)]
+
+    def _add_old_slots(self, bucket, column, count):
+        """
+        Adds (bucket, column, count) entries to the old slot counts, keeping them sorted by bucket.
+        """
+        if bucket.shape[0] == 0:
+            return
+        in_order = (self.old_bucket.shape[0] == 0 or bucket[0] >= self.old_bucket[-1]) and (bucket[1:] >= bucket[:-1]).all()
+        self.old_bucket = np.concatenate([self.old_bucket, bucket])
+        self.old_column = np.concatenate([self.old_column, column])
+        self.old_count = np.concatenate([self.old_count, count])
+        if not in_order:
+            order = np.argsort(self.old_bucket, kind='stable')
+            self.old_bucket, self.old_column, self.old_count = self.old_bucket[order], self.old_column[order], self.old_count[order]
+
+    def _advance(self, bucket):
+        """
+        Moves the head to bucket: the non-zero counts of the ring rows that are reused move to the old slot counts,
+        the rows are cleared, and the old slot counts beyond SLOT_RING_DAYS are dropped.
+        """
+        if self.head_bucket is None:
+            self.head_bucket = bucket
+            return
+        if bucket <= self.head_bucket:
+            return
+        leaving = np.arange(self.head_bucket - RECENT_RING_BUCKETS + 1, min(self.head_bucket, bucket - RECENT_RING_BUCKETS) + 1)
+        if leaving.shape[0] > 0:
+            rows = leaving % RECENT_RING_BUCKETS
+            block = self.slot_counts[rows, :self.n_cells]
+            row, column = np.nonzero(block)
+            self._add_old_slots(leaving[row], column.astype(np.int64), block[row, column].astype(np.int64))
+            self.slot_counts[rows] = 0
+            self.edge_counts_ring[rows] = 0
+        n_drop = int(np.searchsorted(self.old_bucket, bucket - SLOT_RING_BUCKETS, side='right'))
+        if n_drop > 0:
+            self.old_bucket, self.old_column, self.old_count = self.old_bucket[n_drop:], self.old_column[n_drop:], self.old_count[n_drop:]
+        self.daily.drop_days_before(bucket // BUCKETS_PER_DAY - DAILY_RING_DAYS + 1)
+        self.head_bucket = bucket
+
+    def add_trip(self, start_ns, h3_index):
+        """
+        Adds one trip (a trip older than the state is ignored).
+
+        Parameters:
+            start_ns (int): Trip start in nanoseconds since epoch (UTC).
+            h3_index (int): uint64 h3 index of the trip.
+
+        Returns:
+            bool: True if the trip was added.
+        """
+        return self.add_trips([start_ns], [h3_index]) == 1
+
+    def add_trips(self, start_ns, h3_index):
+        """
+        Adds a batch of trips in any order (e.g. the history at start-up or the trips of a tick), vectorized.
+
+        Parameters:
+            start_ns (np.ndarray): Trip starts in nanoseconds since epoch (UTC).
+            h3_index (np.ndarray): uint64 h3 indexes of the trips.
+
+        Returns:
+            int: Number of added trips.
+        """
+        start_ns = np.asarray(start_ns, dtype=np.int64)
+        h3_index = np.asarray(h3_index, dtype=np.uint64)
+        if start_ns.shape[0] == 0:
+            return 0
+        bucket = start_ns // BUCKET_NS
+        self._advance(int(bucket.max()))
+        keep = bucket > self.head_bucket - SLOT_RING_BUCKETS
+        start_ns, h3_index, bucket = start_ns[keep], h3_index[keep], bucket[keep]
+        if bucket.shape[0] == 0:
+            return 0
+        columns = self._columns(h3_index)
+
+        recent = bucket > self.head_bucket - RECENT_RING_BUCKETS
+        np.add.at(self.slot_counts, (bucket[recent] % RECENT_RING_BUCKETS, columns[recent]), 1)
+        if not recent.all():
+            # One entry per (bucket, column) of the older trips
+            old_bucket = bucket[~recent]
+            first_bucket = int(old_bucket.min())
+            key, count = np.unique((old_bucket - first_bucket) * self.n_cells + columns[~recent], return_counts=True)
+            self._add_old_slots(key // self.n_cells + first_bucket, key % self.n_cells, count.astype(np.int64))
+
+        day = bucket // BUCKETS_PER_DAY
+        in_daily = day > self.head_bucket // BUCKETS_PER_DAY - DAILY_RING_DAYS
+        self.daily.add_trips(start_ns[in_daily], h3_index[in_daily])
+        is_edge = (start_ns % BUCKET_NS == 0) & recent
+        np.add.at(self.edge_counts_ring, (bucket[is_edge] % RECENT_RING_BUCKETS, columns[is_edge]), 1)
+        return int(bucket.shape[0])
+
+    def _check_available(self, first_bucket, ring_buckets, name):
+        if self.head_bucket is not None and first_bucket <= self.head_bucket - ring_buckets:
+            raise ValueError("Bucket {} is older than the {} counts of the online state".format(first_bucket, name))
+
+    def _slot_sum(self, start_bucket, end_bucket):
+        # Buckets after the head have no trips yet
+        end_bucket = min(end_bucket, self.head_bucket + 1)
+        if end_bucket <= start_bucket:
+            return np.zeros(self.n_cells, dtype=np.int64)
+        self._check_available(start_bucket, SLOT_RING_BUCKETS, 'slot')
+        result = np.zeros(self.n_cells, dtype=np.int64)
+        recent_start = max(start_bucket, self.head_bucket - RECENT_RING_BUCKETS + 1)
+        if recent_start < end_bucket:
+            rows = np.arange(recent_start, end_bucket) % RECENT_RING_BUCKETS
+            result += self.slot_counts[rows, :self.n_cells].sum(axis=0, dtype=np.int64)
+        old_end = min(end_bucket, recent_start)
+        if start_bucket < old_end:
+            first, last = np.searchsorted(self.old_bucket, [start_bucket, old_end])
+            result += np.bincount(
+                self.old_column[first:last], weights=self.old_count[first:last], minlength=self.n_cells
+            ).astype(np.int64)
+        return result
+
+    def _range_count(self, start_bucket, end_bucket):
+        """
+        Counts per cell in [start_bucket, end_bucket): partial days from the slot ring, whole days from the daily counts.
+        """
+        if self.head_bucket is None or end_bucket <= start_bucket:
+            return np.zeros(self.n_cells, dtype=np.int64)
+        first_full_day = -(-start_bucket // BUCKETS_PER_DAY)
+        end_full_day = end_bucket // BUCKETS_PER_DAY
+        if end_full_day <= first_full_day:
+            return self._slot_sum(start_bucket, end_bucket)
+        result = self._slot_sum(start_bucket, first_full_day * BUCKETS_PER_DAY)
+        result += self._slot_sum(end_full_day * BUCKETS_PER_DAY, end_bucket)
+        head_day = self.head_bucket // BUCKETS_PER_DAY
+        days = np.arange(first_full_day, min(end_full_day, head_day + 1))
+        if days.shape[0] > 0:
+            if days[0] <= head_day - DAILY_RING_DAYS:
+                raise ValueError("Day {} is older than the daily counts of the online state".format(days[0]))
+            # Daily counts are per sorted cell -> columns of the state
+            columns = self._sorted_columns[np.searchsorted(self.cells, self.daily.cells)]
+            result[columns] += self.daily.day_range_counts([days[0]], [days[-1] + 1])[0]
+        return result
+
+    def range_counts(self, start_bucket, end_bucket):
+        """
+        Counts trips per cell in the buckets [start_bucket, end_bucket) for every window (same as TripCountCube).
+
+        Returns:
+            np.ndarray: Trip counts, shape (n_windows, n_cells), cells sorted.
+        """
+        start_bucket = np.asarray(start_bucket, dtype=np.int64).tolist()
+        end_bucket = np.asarray(end_bucket, dtype=np.int64).tolist()
+        result = np.zeros((len(end_bucket), self.n_cells), dtype=np.int64)
+        for i, (start, end) in enumerate(zip(start_bucket, end_bucket)):
+            result[i] = self._range_count(start, end)
+        return result[:, self._sorted_columns]
+
+    def edge_counts(self, bucket):
+        """
+        Counts trips per cell that started exactly at the start of the given bucket (same as TripCountCube).
+
+        Returns:
+            np.ndarray: Trip counts, shape (n_windows, n_cells), cells sorted.
+        """
+        result = np.zeros((len(bucket), self.n_cells), dtype=np.int64)
+        for i, b in enumerate(np.asarray(bucket, dtype=np.int64).tolist()):
+            if self.head_bucket is None or b > self.head_bucket:
+                continue
+            self._check_available(b, RECENT_RING_BUCKETS, 'edge')
+            result[i] = self.edge_counts_ring[b % RECENT_RING_BUCKETS, :self.n_cells]
+        return result[:, self._sorted_columns]
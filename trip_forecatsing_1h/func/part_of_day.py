@@ -1,3 +1,10 @@
+import numpy as np
+import pandas as pd
+
+# Part of day (1-8) of every hour of the day: 3-hour bins starting at midnight
+PART_OF_DAY_BY_HOUR = np.repeat(np.arange(1, 9), 3)
+
+
 def part_of_day(start_date_full):
     """
     Assigns a part-of-day category (1-8) based on the hour and minute of a datetime object.
@@ -18,28 +25,19 @@ def part_of_day(start_date_full):
     Returns:
         int: Integer (1-8) indicating the part of day.
     """
-    total_minutes = start_date_full.hour * 60 + start_date_full.minute
-    if total_minutes >= 0 and total_minutes < 3*60:
-        # late_night
-        return 1
-    elif total_minutes >= 3*60 and total_minutes < 6*60:
-        # early_morning
-        return 2
-    elif total_minutes >= 6*60 and total_minutes < 9*60:
-        # moring
-        return 3
-    elif total_minutes >= 9*60 and total_minutes < 12*60:
-        # late_morning
-        return 4
-    elif total_minutes >= 12*60 and total_minutes < 15*60:
-        # midday
-        return 5
-    elif total_minutes >= 15*60 and total_minutes < 18*60:
-        # afternoon
-        return 6
-    elif total_minutes >= 18*60 and total_minutes < 21*60:
-        # evening
-        return 7
-    else:
-        # late_evening
-        return 8
\ No newline at end of file
+    return int(PART_OF_DAY_BY_HOUR[start_date_full.hour])
+
+
+def part_of_day_array(start_date_full):
+    """
+    Vectorized part_of_day: assigns the part-of-day category (1-8) to many datetimes at once (bin lookup by hour).
+
+    Parameters:
+        start_date_full: Datetimes (Series, DatetimeIndex, datetime64 array or list of datetimes).
+                         Timezone-aware values use their own clock, like part_of_day.
+
+    Returns:
+        np.ndarray: int64 array (1-8) indicating the part of day.
+    """
+    hour = pd.DatetimeIndex(start_date_full).hour.to_numpy()
+    return PART_OF_DAY_BY_HOUR[hour]
@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def proximity_score_soft(yt, yp):
+    """
+    How close the prediction was to the actual value - from 0 (complete miss) to 1 (perfect match).
+    Works on single values and on whole arrays.
+
+    Parameters:
+        yt: Actual trip count(s).
+        yp: Predicted trip count(s).
+
+    Returns:
+        float or np.ndarray: 1 - |yt - yp| / max(|yt|, |yp|, 1).
+    """
+    yt = np.asarray(yt, dtype=np.float64)
+    yp = np.asarray(yp, dtype=np.float64)
+    denom = np.maximum(np.maximum(np.abs(yt), np.abs(yp)), 1)
+    return 1 - np.abs(yt - yp) / denom
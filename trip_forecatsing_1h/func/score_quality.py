@@ -0,0 +1,169 @@
+"""
+score_quality.py
+
+This module evaluates the score files (score_YYYY_MM_all.parquet, written by 04_backfill.py) against the actual trip counts.
+The metrics are computed as array operations over whole files and kept as additive sums per group:
+    - a group-by is one np.bincount per sum (no loop over rows or groups)
+    - the sums of a score file are computed once and stored; only new or changed files are read again
+    - the report of any set of score files is the sum of their stored sums
+
+Groups: overall, h3_cell, part_of_day (1-8, func/part_of_day.py), weekday (Monday = 0), month ('YYYY-MM'),
+all from prediction_date_time_start.
+
+Report per group key:
+    - n: number of (cell, window) rows
+    - mae, bias (mean of prediction - actual), rmse of trip_count_predict
+    - accuracy, round_accuracy: mean proximity_score_soft of trip_count_predict and trip_count_predict_round
+      (trip_count_predict_accuracy / trip_count_predict_round_accuracy before their rounding to two decimals)
+
+Stats layout:
+    - <stats_dir>/<score file name>: sums of one score file (columns group, key + SUM_COLUMNS)
+    - <stats_dir>/manifest.json: size and mtime of every evaluated score file
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from func.part_of_day import part_of_day_array
+from func.proximity_score import proximity_score_soft
+
+SCORE_COLUMNS = ['h3_cell', 'prediction_date_time_start', 'trip_count', 'trip_count_predict', 'trip_count_predict_round']
+GROUPS = ['overall', 'h3_cell', 'part_of_day', 'weekday', 'month']
+SUM_COLUMNS = ['n', 'sum_abs_error', 'sum_error', 'sum_squared_error', 'sum_accuracy', 'sum_round_accuracy']
+# Bumped when the stored sums change (forces re-evaluation)
+STATS_VERSION = 1
+
+
+def _read_manifest(stats_dir):
+    manifest_path = os.path.join(stats_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return dict()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(stats_dir, manifest):
+    tmp_path = os.path.join(stats_dir, 'manifest.tmp.json')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(stats_dir, 'manifest.json'))
+
+
+def _group_codes(df_score):
+    # group -> (code of every row, key of every code)
+    start = df_score['prediction_date_time_start']
+    n_rows = df_score.shape[0]
+    cell_codes, cells = pd.factorize(df_score['h3_cell'])
+    months, month_codes = np.unique((start.dt.year * 12 + start.dt.month - 1).to_numpy(), return_inverse=True)
+    return {
+        'overall': (np.zeros(n_rows, dtype=np.int64), np.array(['all'])),
+        'h3_cell': (cell_codes, np.asarray(cells, dtype=str)),
+        'part_of_day': (part_of_day_array(start), np.arange(9).astype(str)),
+        'weekday': (start.dt.dayofweek.to_numpy(), np.arange(7).astype(str)),
+        'month': (month_codes, np.array(['{}-{:02d}'.format(m // 12, m % 12 + 1) for m in months]))
+    }
+
+
+def score_sums(df_score):
+    """
+    Computes the sums of every group key of the scored rows.
+
+    Parameters:
+        df_score (pd.DataFrame): Scored rows with SCORE_COLUMNS (trip_count_predict_round is optional).
+
+    Returns:
+        pd.DataFrame: Columns group, key and SUM_COLUMNS (keys without rows are dropped).
+    """
+    y = df_score['trip_count'].to_numpy(dtype=np.float64, na_value=0)
+    y_pred = df_score['trip_count_predict'].to_numpy(dtype=np.float64)
+    if 'trip_count_predict_round' in df_score:
+        y_pred_round = df_score['trip_count_predict_round'].to_numpy(dtype=np.float64)
+    else:
+        # older score files have no rounded prediction
+        y_pred_round = np.round(y_pred)
+    error = y_pred - y
+    row_values = {
+        'n': None,
+        'sum_abs_error': np.abs(error),
+        'sum_error': error,
+        'sum_squared_error': error ** 2,
+        'sum_accuracy': proximity_score_soft(y, y_pred),
+        'sum_round_accuracy': proximity_score_soft(y, y_pred_round)
+    }
+    df_sums_list = list()
+    for group, (codes, keys) in _group_codes(df_score).items():
+        df_group = pd.DataFrame({'group': group, 'key': keys})
+        for name, values in row_values.items():
+            df_group[name] = np.bincount(codes, weights=values, minlength=keys.shape[0])
+        df_sums_list.append(df_group[df_group['n'] > 0])
+    return pd.concat(df_sums_list, ignore_index = True)
+
+
+def update_score_quality(score_paths, stats_dir):
+    """
+    Computes and stores the sums of the new or changed score files
+    (a file is evaluated again only if its size or mtime changed).
+
+    Parameters:
+        score_paths (list): Score parquet files.
+        stats_dir (str): Folder of the stored sums.
+
+    Returns:
+        int: Number of evaluated files.
+    """
+    os.makedirs(stats_dir, exist_ok=True)
+    manifest = _read_manifest(stats_dir)
+    n_evaluated = 0
+    for score_path in score_paths:
+        name = os.path.basename(score_path)
+        stat = os.stat(score_path)
+        source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'version': STATS_VERSION}
+        if manifest.get(name) == source:
+            continue
+
+        print("Evaluating {}...".format(score_path))
+        columns = [col for col in SCORE_COLUMNS if col in pq.read_schema(score_path).names]
+        df_score = pq.read_table(score_path, columns = columns).to_pandas()
+        tmp_path = os.path.join(stats_dir, name + '.tmp')
+        score_sums(df_score).to_parquet(tmp_path, index = False)
+        os.replace(tmp_path, os.path.join(stats_dir, name))
+        manifest[name] = source
+        _write_manifest(stats_dir, manifest)
+        n_evaluated += 1
+    print("[OK] Score quality is up to date ({} file(s) evaluated)".format(n_evaluated))
+    return n_evaluated
+
+
+def quality_report(score_paths, stats_dir):
+    """
+    Builds the quality report of the given score files from their stored sums (see update_score_quality).
+
+    Parameters:
+        score_paths (list): Score parquet files.
+        stats_dir (str): Folder of the stored sums.
+
+    Returns:
+        dict: group -> pd.DataFrame with the columns key, n, mae, bias, rmse, accuracy, round_accuracy.
+    """
+    df_sums = pd.concat(
+        [pd.read_parquet(os.path.join(stats_dir, os.path.basename(score_path))) for score_path in score_paths],
+        ignore_index = True
+    )
+    df_sums = df_sums.groupby(['group', 'key'], sort = True)[SUM_COLUMNS].sum().reset_index()
+    n = df_sums['n']
+    df_report = pd.DataFrame({
+        'group': df_sums['group'],
+        'key': df_sums['key'],
+        'n': n.astype(np.int64),
+        'mae': df_sums['sum_abs_error'] / n,
+        'bias': df_sums['sum_error'] / n,
+        'rmse': np.sqrt(df_sums['sum_squared_error'] / n),
+        'accuracy': df_sums['sum_accuracy'] / n,
+        'round_accuracy': df_sums['sum_round_accuracy'] / n
+    })
+    return {
+        group: df_report[df_report['group'] == group].drop(columns = ['group']).reset_index(drop = True)
+        for group in GROUPS
+    }
@@ -1,6 +1,9 @@
-def season_of_year(month):
+import numpy as np
+
+
+def season_of_year_array(month):
     """
-    Assigns a season number (1-4) based on the month.
+    Vectorized season number (1-4) of many months at once.
 
     Seasons:
     1 = Winter     (January, February, December)
@@ -8,18 +11,28 @@ def season_of_year(month):
     3 = Summer     (June, July, August)
     4 = Autumn     (September, October, November)
 
+    Parameters:
+        month (array-like): Months as integers (1-12).
+
+    Returns:
+        np.ndarray: int64 array (1-4); any other value is 4, like season_of_year.
+    """
+    month = np.asarray(month)
+    return np.select(
+        [np.isin(month, [1, 2, 12]), np.isin(month, [3, 4, 5]), np.isin(month, [6, 7, 8])],
+        [1, 2, 3],
+        default = 4
+    )
+
+
+def season_of_year(month):
+    """
+    Assigns a season number (1-4) based on the month (see season_of_year_array).
+
     Parameters:
         month (int): The month as an integer (1-12).
 
     Returns:
         int: Integer representing the season (1-4).
     """
-
-    if month in [1, 2, 12]:
-        return 1
-    elif month in [3, 4, 5]:
-        return 2
-    elif month in [6, 7, 8]:
-        return 3
-    else:
-        return 4
\ No newline at end of file
+    return int(season_of_year_array(month))
@@ -0,0 +1,213 @@
+"""
+train_dataset.py
+
+This module builds the LightGBM training data out of core, directly from the feature store partitions
+(func/feature_store.py, one parquet file per day), instead of one frame and one matrix holding all days:
+
+    - every stored day is one lgb.Sequence; LightGBM samples rows from them to find the feature bins
+      and then reads them in batches, so only the model input of one day (func/feature_matrix.py) is in memory
+    - the binned Dataset is saved to a binary file next to the feature store days, keyed by the dates,
+      the features and the binning parameters; a later run on the same days (re-run, tuning) loads it
+      without reading the days again
+    - the target and the window start of all rows are read at once (two columns), for the split and the metrics
+
+The train/validation/test parts are subsets of the full Dataset (same feature bins).
+cache_dataset builds a missing cache file in a forked child process, so the training script does not run LightGBM
+(and its OpenMP threads) before it forks the tuning and backtest workers.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import numpy as np
+import pyarrow.parquet as pq
+import lightgbm as lgb
+from func.feature_matrix import build_feature_matrix, build_target
+
+# Binning parameters of the cached Dataset (a change invalidates the cache);
+# no feature pre-filtering, so the same Dataset can be trained with any min_child_samples (func/tuning.py)
+DATASET_PARAMS = {'max_bin': 255, 'min_data_in_bin': 3, 'bin_construct_sample_cnt': 200000, 'feature_pre_filter': False, 'verbose': -1}
+
+
+def weighted_subset(full_set, rows, weight):
+    """
+    Takes the rows of the full Dataset as a weighted training Dataset.
+    The subset is constructed before the weight is set: LightGBM drops a weight set on a subset that is not constructed yet.
+
+    Parameters:
+        full_set (lgb.Dataset): Constructed full Dataset.
+        rows (np.ndarray): Rows of the subset.
+        weight (np.ndarray): Weight of every row of rows.
+
+    Returns:
+        lgb.Dataset: The constructed subset with its weights.
+    """
+    order = np.argsort(rows, kind='stable')
+    train_set = full_set.subset(rows[order]).construct()
+    train_set.set_weight(weight[order])
+    return train_set
+
+
+class _DayMatrixCache:
+    """Model input of the last day read (LightGBM reads the rows of one day after another)."""
+
+    def __init__(self, features_col, part_of_day_labels, day_labels):
+        self.features_col = features_col
+        self.part_of_day_labels = part_of_day_labels
+        self.day_labels = day_labels
+        self.path = None
+        self.X = None
+
+    def get(self, path):
+        if path != self.path:
+            df_day = pq.read_table(path, partitioning = None).to_pandas()
+            self.X = build_feature_matrix(df_day, self.features_col, self.part_of_day_labels, self.day_labels)
+            self.path = path
+        return self.X
+
+
+class _DaySequence(lgb.Sequence):
+    """One stored day as an lgb.Sequence."""
+
+    batch_size = 4096
+
+    def __init__(self, path, n_rows, cache):
+        self.path = path
+        self.n_rows = n_rows
+        self.cache = cache
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, idx):
+        # LightGBM expects float64 rows
+        return self.cache.get(self.path)[idx].astype(np.float64)
+
+
+class FeatureStoreData:
+    """
+    Training windows of the stored days, read day by day.
+
+    Parameters:
+        day_files (list): (parquet path, number of rows) of every day (feature_store.stored_day_files).
+        features_col (list): Model features.
+        part_of_day_labels (dict): part_of_day value -> flag column name.
+        day_labels (dict): day of week value (Monday = 0) -> flag column name.
+        target_col (str): Target column.
+
+    Attributes:
+        y (np.ndarray): float32 target of every row (days in the order of day_files).
+        window_start (pd.Series): prediction_date_time_start of every row.
+    """
+
+    def __init__(self, day_files, features_col, part_of_day_labels, day_labels, target_col):
+        self.day_files = day_files
+        self.features_col = features_col
+        self._cache = _DayMatrixCache(features_col, part_of_day_labels, day_labels)
+        self._offsets = np.cumsum([0] + [n_rows for _, n_rows in day_files])
+        df_target = pq.read_table(
+            [path for path, _ in day_files], columns = [target_col, 'prediction_date_time_start'], partitioning = None
+        ).to_pandas()
+        self.y = build_target(df_target, target_col)
+        self.window_start = df_target['prediction_date_time_start']
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _cache_key(self):
+        key = {
+            'days': [os.path.basename(path) for path, _ in self.day_files],
+            'rows': [int(n_rows) for _, n_rows in self.day_files],
+            'features': list(self.features_col),
+            'params': DATASET_PARAMS,
+            'lightgbm': lgb.__version__
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def cache_path(self, cache_dir):
+        """Path of the binary cache file of these days in cache_dir (see dataset)."""
+        return os.path.join(cache_dir, 'dataset_{}.bin'.format(self._cache_key()))
+
+    def dataset(self, cache_dir):
+        """
+        Builds the binned Dataset of all rows, or loads it from the binary cache file in cache_dir.
+        Other cached Datasets in cache_dir (other days) are removed, only the latest one is kept.
+
+        Parameters:
+            cache_dir (str): Folder of the binary cache file.
+
+        Returns:
+            lgb.Dataset: Constructed Dataset (with the target).
+        """
+        dataset_path = self.cache_path(cache_dir)
+        if os.path.exists(dataset_path):
+            print("[OK] Binned training data loaded from {}".format(dataset_path))
+            return lgb.Dataset(dataset_path, params = DATASET_PARAMS).construct()
+
+        full_set = lgb.Dataset(
+            [_DaySequence(path, n_rows, self._cache) for path, n_rows in self.day_files],
+            label = self.y,
+            feature_name = self.features_col,
+            params = DATASET_PARAMS
+        ).construct()
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.startswith('dataset_') and name.endswith('.bin'):
+                os.remove(os.path.join(cache_dir, name))
+        tmp_path = os.path.join(cache_dir, 'dataset.tmp.bin')
+        full_set.save_binary(tmp_path)
+        os.replace(tmp_path, dataset_path)
+        print("[OK] Binned training data saved to {}".format(dataset_path))
+        return full_set
+
+    def predict(self, booster, rows):
+        """
+        Predicts the given rows day by day.
+
+        Parameters:
+            booster (lgb.Booster): Model.
+            rows (np.ndarray): Row indexes (sorted).
+
+        Returns:
+            np.ndarray: Predictions in the order of rows.
+        """
+        y_pred = np.empty(rows.shape[0], dtype=np.float64)
+        day_of_row = np.searchsorted(self._offsets, rows, side='right') - 1
+        for day in np.unique(day_of_row):
+            sel = np.flatnonzero(day_of_row == day)
+            X_day = self._cache.get(self.day_files[day][0])
+            y_pred[sel] = booster.predict(X_day[rows[sel] - self._offsets[day]])
+        return y_pred
+
+
+def _build_dataset_cache(data, cache_dir):
+    data.dataset(cache_dir)
+
+
+def cache_dataset(data, cache_dir):
+    """
+    Makes sure the binary Dataset cache of data exists in cache_dir (see FeatureStoreData.dataset).
+    A missing cache is built in a forked child process: the calling process forks the tuning and backtest workers
+    afterwards, and a process forked after LightGBM has run its OpenMP threads can hang.
+
+    Parameters:
+        data (FeatureStoreData): Training windows of the stored days.
+        cache_dir (str): Folder of the binary cache file.
+
+    Returns:
+        str: Path of the binary cache file.
+    """
+    dataset_path = data.cache_path(cache_dir)
+    if os.path.exists(dataset_path):
+        print("[OK] Binned training data found in {}".format(dataset_path))
+        return dataset_path
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        data.dataset(cache_dir)
+        return dataset_path
+    process = multiprocessing.get_context('fork').Process(target=_build_dataset_cache, args=(data, cache_dir))
+    process.start()
+    process.join()
+    if process.exitcode != 0 or not os.path.exists(dataset_path):
+        raise RuntimeError("Building the binned training data failed (exit code {})".format(process.exitcode))
+    return dataset_path
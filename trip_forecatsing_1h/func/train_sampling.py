@@ -0,0 +1,35 @@
+"""
+train_sampling.py
+
+This module provides the zero-target downsampling of the training rows.
+Most collected (cell, window) rows have trip_count = 0; keeping only a share of them cuts the training rows
+and the fit time. Every kept zero row gets the weight 1 / keep_rate, so the weighted training loss
+(and the mean prediction) matches the full data in expectation.
+
+Only the training part is sampled; the validation and test rows are always used in full.
+"""
+
+import numpy as np
+
+
+def sample_zero_targets(y, keep_rate, random_state = 42):
+    """
+    Keeps every row with a positive target and a random share of the zero-target rows.
+
+    Parameters:
+        y (np.ndarray): Target of every training row.
+        keep_rate (float): Share of the zero-target rows to keep (0 < keep_rate <= 1).
+        random_state (int): Seed of the sampling.
+
+    Returns:
+        tuple: (row indexes in the input order, sample weights of these rows as float32)
+    """
+    y = np.asarray(y)
+    if keep_rate >= 1:
+        return np.arange(y.shape[0]), np.ones(y.shape[0], dtype=np.float32)
+    rng = np.random.default_rng(random_state)
+    is_zero = y == 0
+    keep = ~is_zero | (rng.random(y.shape[0]) < keep_rate)
+    idx = np.flatnonzero(keep)
+    weights = np.where(is_zero[idx], 1 / keep_rate, 1).astype(np.float32)
+    return idx, weights
@@ -0,0 +1,49 @@
+"""
+train_split.py
+
+This module provides the chronological (forward) split of the collected training windows.
+A random split puts overlapping 10-minute windows of the same hour into train and test, so the test error
+is optimistic; here the windows are ordered by prediction_date_time_start and the last ones are held out:
+
+    | train | gap | validation (early stopping) | gap | test (reported metrics) |
+
+The target of a window is the next hour, so the train (validation) windows whose target hour reaches
+into the next part are dropped (gap = one prediction window).
+"""
+
+import numpy as np
+from datetime import timedelta
+from func.count_cube import to_epoch_ns
+
+# Length of the prediction window (target of every row)
+WINDOW_LENGTH = timedelta(hours = 1)
+
+
+def time_split(window_start, test_size = 0.2, valid_size = 0.1, gap = WINDOW_LENGTH):
+    """
+    Splits the rows chronologically by window start; all rows of a window fall into the same part.
+
+    Parameters:
+        window_start (array-like): prediction_date_time_start of every row.
+        test_size (float): Share of the windows held out for the test metrics (the latest windows).
+        valid_size (float): Share of the windows used for early stopping (the windows before the test part).
+        gap (timedelta): Windows starting less than gap before the next part are dropped.
+
+    Returns:
+        tuple: Row indexes (train_idx, valid_idx, test_idx), each in the input order.
+    """
+    start_ns = to_epoch_ns(window_start)
+    windows = np.unique(start_ns)
+    n_windows = windows.shape[0]
+    n_test = int(round(n_windows * test_size))
+    n_valid = int(round(n_windows * valid_size))
+    gap_ns = int(gap.total_seconds() * 10**9)
+
+    # First window of the validation and of the test part
+    test_from = windows[n_windows - n_test] if n_test > 0 else np.iinfo(np.int64).max
+    valid_from = windows[n_windows - n_test - n_valid] if n_valid > 0 else test_from
+
+    train_mask = start_ns <= valid_from - gap_ns
+    valid_mask = (start_ns >= valid_from) & (start_ns <= test_from - gap_ns)
+    test_mask = start_ns >= test_from
+    return np.flatnonzero(train_mask), np.flatnonzero(valid_mask), np.flatnonzero(test_mask)
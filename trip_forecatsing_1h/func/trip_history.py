@@ -0,0 +1,104 @@
+"""
+trip_history.py
+
+This module defines the slim, typed trip history frame used by the feature engines (collect_data, count cube).
+Only the columns the features need are kept, with compact types instead of Python objects
+(no datetime.date / datetime.time objects, no h3 strings, no per-trip calendar columns).
+
+Columns:
+    - start_date_full: datetime64[ns, UTC]
+    - start_day: int32 day ordinal (days since 1970-01-01, UTC), see day_ordinal
+    - h3_index: uint64 h3 index (func/h3_index.py)
+
+The calendar flags are computed per window from its start, not per trip.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from func.count_cube import DAY_NS, DAY_ORIGIN, to_epoch_ns
+
+# Columns of the trip store needed to build the history
+HISTORY_COLUMNS = ['SpecifiedStartDate', 'h3_index']
+
+
+def day_ordinal(day):
+    """
+    Converts a date (or the date of a datetime) to the day ordinal of the trip history.
+
+    Parameters:
+        day (date or datetime): The day.
+
+    Returns:
+        int: Days since 1970-01-01.
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    return (day - DAY_ORIGIN).days
+
+
+def trip_history_frame(df_store):
+    """
+    Builds the slim trip history from the trips read from the store.
+
+    Parameters:
+        df_store (pd.DataFrame): Trips with 'SpecifiedStartDate' (UTC) and 'h3_index'.
+
+    Returns:
+        pd.DataFrame: Trip history (see the module docstring), in the input order.
+    """
+    start_ns = to_epoch_ns(df_store['SpecifiedStartDate'])
+    return pd.DataFrame({
+        'start_date_full': pd.to_datetime(start_ns, unit='ns', utc=True),
+        'start_day': (start_ns // DAY_NS).astype(np.int32),
+        'h3_index': df_store['h3_index'].to_numpy(dtype=np.uint64)
+    })
+
+
+
+class TripHistory:
+    """
+    Trip history indexed by start time: any [start, end) range is found by binary search (np.searchsorted)
+    on the sorted start times and returned as a slice of the frame (no boolean mask over the whole column, no copy).
+
+    Parameters:
+        df (pd.DataFrame): Slim trip history (see trip_history_frame); sorted by start_date_full if it is not yet.
+    """
+
+    def __init__(self, df):
+        start_ns = to_epoch_ns(df['start_date_full'])
+        if start_ns.shape[0] > 1 and (start_ns[1:] < start_ns[:-1]).any():
+            order = np.argsort(start_ns, kind='stable')
+            df = df.iloc[order].reset_index(drop=True)
+            start_ns = start_ns[order]
+        self.df = df
+        self.start_ns = start_ns
+
+    def __len__(self):
+        return self.start_ns.shape[0]
+
+    def bounds(self, start, end, include_end = False):
+        """
+        Positions of the trips with start <= start_date_full < end (<= end if include_end).
+
+        Parameters:
+            start (datetime): Range start (UTC, included).
+            end (datetime): Range end (UTC).
+            include_end (bool): Whether trips exactly at end are included.
+
+        Returns:
+            tuple: (first, last) positions, the range is rows first..last-1.
+        """
+        first = int(np.searchsorted(self.start_ns, to_epoch_ns(start), side='left'))
+        last = int(np.searchsorted(self.start_ns, to_epoch_ns(end), side='right' if include_end else 'left'))
+        return first, max(first, last)
+
+    def slice(self, start, end, include_end = False):
+        """
+        Trips of a time range (see bounds) as a slice of the history frame.
+
+        Returns:
+            pd.DataFrame: Trips of the range, in start time order.
+        """
+        first, last = self.bounds(start, end, include_end)
+        return self.df.iloc[first:last]
@@ -0,0 +1,314 @@
+"""
+trip_store.py
+
+This module provides a columnar, month-partitioned trip store built from the monthly json files.
+Every data-YYYY-MM-01.json is converted once into a parquet partition (month=YYYY-MM) with typed
+timestamps and precomputed h3 indexes, so the scripts do not re-parse two years of json on every run.
+
+Store layout:
+    - <store_dir>/month=YYYY-MM/part-0.parquet (sorted by SpecifiedStartDate)
+    - <store_dir>/manifest.json: size and mtime of every ingested source file + h3 resolution and store version
+
+Columns:
+    - SpecifiedStartDate: timestamp (UTC)
+    - LatitudeStart, LongitudeStart: float64
+    - h3_index: uint64 h3 index of the start point (func/h3_index.py)
+
+TripFeed reads the trips appended to the json files since its last poll (for the scoring service),
+without re-parsing the whole month on every tick.
+"""
+
+import glob
+import io
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dateutil.relativedelta import relativedelta
+from func.h3_index import geo_to_h3_array
+
+STORE_COLUMNS = ['SpecifiedStartDate', 'LatitudeStart', 'LongitudeStart']
+ROW_GROUP_SIZE = 64 * 1024
+# Bumped when the layout of the partitions changes (forces re-ingestion)
+STORE_VERSION = 2
+# Columns that identify a trip when a rewritten json file is compared with its previous content
+TRIP_KEY_COLUMNS = ['SpecifiedStartDate', 'LatitudeStart', 'LongitudeStart']
+
+
+def _read_manifest(store_dir):
+    manifest_path = os.path.join(store_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return dict()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(store_dir, manifest):
+    tmp_path = os.path.join(store_dir, 'manifest.tmp.json')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(store_dir, 'manifest.json'))
+
+
+def _typed_trips(df, resolution):
+    # Store columns of the parsed json records, typed, with the h3 index
+    if df.shape[0] == 0:
+        df = pd.DataFrame(columns = STORE_COLUMNS)
+    df = df[STORE_COLUMNS].copy()
+    df['SpecifiedStartDate'] = pd.to_datetime(df['SpecifiedStartDate'], format="ISO8601", utc=True)
+    df['LatitudeStart'] = df['LatitudeStart'].astype('float64')
+    df['LongitudeStart'] = df['LongitudeStart'].astype('float64')
+    df['h3_index'] = geo_to_h3_array(df['LatitudeStart'].to_numpy(), df['LongitudeStart'].to_numpy(), resolution)
+    return df
+
+
+def ingest_trip_store(data_dir, store_dir, resolution):
+    """
+    Converts new or changed monthly json files into the parquet store.
+    A file is (re-)ingested only if its size or mtime changed since the last ingestion
+    (or if the h3 resolution or the store version changed).
+
+    Parameters:
+        data_dir (str): Folder with data-YYYY-MM-01.json files.
+        store_dir (str): Folder of the parquet store.
+        resolution (int): h3 resolution of the precomputed cells.
+
+    Returns:
+        int: Number of ingested files.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = _read_manifest(store_dir)
+    n_ingested = 0
+    for file_path in sorted(glob.glob(os.path.join(data_dir, 'data-*-01.json'))):
+        match = re.match(r'data-(\d{4}-\d{2})-01\.json$', os.path.basename(file_path))
+        if match is None:
+            continue
+        month = match.group(1)
+        stat = os.stat(file_path)
+        source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'resolution': resolution, 'version': STORE_VERSION}
+        if manifest.get(month) == source:
+            continue
+
+        print("Ingesting {}...".format(file_path))
+        df = _typed_trips(pd.read_json(file_path), resolution)
+        df = df.sort_values(by = ['SpecifiedStartDate']).reset_index(drop = True)
+
+        partition_dir = os.path.join(store_dir, 'month={}'.format(month))
+        os.makedirs(partition_dir, exist_ok=True)
+        tmp_path = os.path.join(partition_dir, 'part-0.tmp.parquet')
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, os.path.join(partition_dir, 'part-0.parquet'))
+
+        manifest[month] = source
+        _write_manifest(store_dir, manifest)
+        n_ingested += 1
+    print("[OK] Trip store is up to date ({} file(s) ingested)".format(n_ingested))
+    return n_ingested
+
+
+def _range_months(start, end):
+    months = list()
+    current_date = pd.Timestamp(start).date().replace(day=1)
+    while pd.Timestamp(current_date).tz_localize('UTC') < pd.Timestamp(end):
+        months.append(current_date.strftime("%Y-%m"))
+        current_date += relativedelta(months=1)
+    return months
+
+
+def _available_months(store_dir):
+    return sorted(
+        name.split('=', 1)[1] for name in os.listdir(store_dir) if name.startswith('month=')
+    ) if os.path.exists(store_dir) else []
+
+
+def _read_months(store_dir, months, expression_of, columns):
+    paths = [os.path.join(store_dir, 'month={}'.format(month), 'part-0.parquet') for month in months]
+    if not paths:
+        return pd.DataFrame(columns = columns if columns is not None else STORE_COLUMNS + ['h3_index'])
+
+    dataset = ds.dataset(paths, format='parquet')
+    expression = expression_of(dataset.schema.field('SpecifiedStartDate').type)
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    if 'SpecifiedStartDate' in df:
+        df = df.sort_values(by = ['SpecifiedStartDate'], kind = 'stable').reset_index(drop = True)
+    return df
+
+
+def read_trip_store(store_dir, start = None, end = None, columns = None):
+    """
+    Reads the trips with start <= SpecifiedStartDate < end from the store.
+    Only the month partitions overlapping the range are opened, and the time filter is pushed down
+    to the parquet row groups.
+
+    Parameters:
+        store_dir (str): Folder of the parquet store.
+        start (datetime): Range start (UTC, included), None for no lower bound.
+        end (datetime): Range end (UTC, excluded), None for no upper bound.
+        columns (list): Columns to read (default: all store columns).
+
+    Returns:
+        pd.DataFrame: Trips sorted by SpecifiedStartDate.
+    """
+    available_months = _available_months(store_dir)
+
+    months = available_months
+    if start is not None and end is not None:
+        months = _range_months(start, end)
+        for month in months:
+            if month not in available_months:
+                print(f"⚠️ Month not found in store: {month}")
+        months = [month for month in months if month in available_months]
+
+    def expression_of(time_type):
+        expression = None
+        if start is not None:
+            expression = ds.field('SpecifiedStartDate') >= pa.scalar(pd.Timestamp(start), type=time_type)
+        if end is not None:
+            end_expression = ds.field('SpecifiedStartDate') < pa.scalar(pd.Timestamp(end), type=time_type)
+            expression = end_expression if expression is None else expression & end_expression
+        return expression
+
+    return _read_months(store_dir, months, expression_of, columns)
+
+
+def read_trip_store_ranges(store_dir, ranges, columns = None):
+    """
+    Reads the trips of several time ranges (start <= SpecifiedStartDate < end for any range) in one pass.
+    Only the month partitions overlapping a range are opened.
+
+    Parameters:
+        store_dir (str): Folder of the parquet store.
+        ranges (list): (start, end) pairs of UTC datetimes.
+        columns (list): Columns to read (default: all store columns).
+
+    Returns:
+        pd.DataFrame: Trips sorted by SpecifiedStartDate.
+    """
+    available_months = _available_months(store_dir)
+    months = sorted(set(month for start, end in ranges for month in _range_months(start, end)))
+    for month in months:
+        if month not in available_months:
+            print(f"⚠️ Month not found in store: {month}")
+    months = [month for month in months if month in available_months]
+
+    def expression_of(time_type):
+        expression = None
+        for start, end in ranges:
+            range_expression = (
+                (ds.field('SpecifiedStartDate') >= pa.scalar(pd.Timestamp(start), type=time_type)) &
+                (ds.field('SpecifiedStartDate') < pa.scalar(pd.Timestamp(end), type=time_type))
+            )
+            expression = range_expression if expression is None else expression | range_expression
+        return expression
+
+    return _read_months(store_dir, months, expression_of, columns)
+
+
+class TripFeed:
+    """
+    Trips appended to the monthly json files (data-YYYY-MM-01.json, one json array each) since the last poll.
+
+        - a file that only grew (its bytes before the previous closing ']' are unchanged) is read from the previous
+          closing ']' on, so only the appended records are parsed
+        - any other change (a new or rewritten file) parses the whole file; only the trips that were not returned
+          before are returned (compared by TRIP_KEY_COLUMNS and occurrence)
+        - a file that cannot be parsed (being written) is read again on the next poll
+
+    The trips are returned whatever their start time, so the late ones (starting before the last scored window) are kept.
+
+    Parameters:
+        data_dir (str): Folder with data-YYYY-MM-01.json files.
+        resolution (int): h3 resolution of the returned cells.
+        since_month (str): First month ('YYYY-MM') whose file is watched (the older months are read from the store).
+    """
+
+    # Bytes before the closing ']' that must be unchanged for an append-only read
+    TAIL_BYTES = 64
+
+    def __init__(self, data_dir, resolution, since_month):
+        self.data_dir = data_dir
+        self.resolution = resolution
+        self.since_month = since_month
+        # path -> size, mtime_ns, end (offset of the closing ']'), tail (bytes before it), keys (returned trips)
+        self._files = dict()
+
+    def _parse(self, payload):
+        return _typed_trips(pd.read_json(io.BytesIO(payload)), self.resolution)
+
+    def _read_appended(self, file_path, state, size):
+        # Records after the previous closing ']', None if the file was not only appended to
+        tail = state['tail']
+        with open(file_path, 'rb') as f:
+            f.seek(state['end'] - len(tail))
+            data = f.read(size - state['end'] + len(tail))
+        if not data.startswith(tail):
+            return None
+        appended = data[len(tail):].lstrip()
+        if appended.startswith(b','):
+            payload = b'[' + appended[1:]
+        elif appended.startswith(b'{') and tail.rstrip().endswith(b'['):
+            # the array was empty
+            payload = b'[' + appended
+        else:
+            return None
+        end = data.rfind(b']')
+        df_new = self._parse(payload)
+        return df_new, state['end'] - len(tail) + end, data[max(0, end - self.TAIL_BYTES):end]
+
+    def _read_file(self, file_path, state):
+        # Whole file, only the trips that were not returned before
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        df_all = self._parse(data)
+        end = data.rfind(b']')
+        is_new = np.ones(df_all.shape[0], dtype=bool)
+        if state is not None and state['keys'].shape[0] > 0:
+            # Occurrence number of every key, so repeated trips are matched one to one
+            df_keys = df_all[TRIP_KEY_COLUMNS].copy()
+            df_keys['occurrence'] = df_keys.groupby(TRIP_KEY_COLUMNS, sort = False).cumcount()
+            df_seen = state['keys'].copy()
+            df_seen['occurrence'] = df_seen.groupby(TRIP_KEY_COLUMNS, sort = False).cumcount()
+            merged = df_keys.merge(df_seen, how = 'left', on = TRIP_KEY_COLUMNS + ['occurrence'], indicator = True)
+            is_new = (merged['_merge'] == 'left_only').to_numpy()
+        return df_all[is_new].reset_index(drop = True), df_all[TRIP_KEY_COLUMNS], end, data[max(0, end - self.TAIL_BYTES):end]
+
+    def poll(self):
+        """
+        Reads the trips appended since the last poll (the first poll returns all trips of the watched files).
+
+        Returns:
+            pd.DataFrame: New trips with the store columns, sorted by SpecifiedStartDate.
+        """
+        df_new_list = list()
+        for file_path in sorted(glob.glob(os.path.join(self.data_dir, 'data-*-01.json'))):
+            match = re.match(r'data-(\d{4}-\d{2})-01\.json$', os.path.basename(file_path))
+            if match is None or match.group(1) < self.since_month:
+                continue
+            stat = os.stat(file_path)
+            state = self._files.get(file_path)
+            if state is not None and (state['size'], state['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            try:
+                appended = None
+                if state is not None and stat.st_size > state['size']:
+                    appended = self._read_appended(file_path, state, stat.st_size)
+                if appended is not None:
+                    df_new, end, tail = appended
+                    keys = pd.concat([state['keys'], df_new[TRIP_KEY_COLUMNS]], ignore_index = True)
+                else:
+                    df_new, keys, end, tail = self._read_file(file_path, state)
+            except ValueError as e:
+                print("⚠️ {} could not be read, retrying on the next poll: {}".format(file_path, e))
+                continue
+            self._files[file_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'end': end, 'tail': tail, 'keys': keys}
+            df_new_list.append(df_new)
+
+        if not df_new_list:
+            return _typed_trips(pd.DataFrame(), self.resolution)
+        df_new = pd.concat(df_new_list, ignore_index = True)
+        return df_new.sort_values(by = ['SpecifiedStartDate'], kind = 'stable').reset_index(drop = True)
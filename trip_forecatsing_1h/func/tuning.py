@@ -0,0 +1,160 @@
+"""
+tuning.py
+
+This module searches the LightGBM parameters by successive halving with a fixed compute budget:
+
+    - n_trials parameter sets are drawn from PARAM_GRID (the first one is the current model_params)
+    - rung 0 fits every trial with min_rounds trees, each further rung keeps the best 1 / eta of the trials
+      and fits them with eta times more trees (at most max_rounds), until the next rung would have one trial
+    - every fit uses early stopping on the validation rows; the score is the best validation MAE
+    - subsample is applied with subsample_freq = 1 (without a bagging frequency LightGBM ignores it)
+
+The trials of a rung run in parallel worker processes. Every worker loads the cached binned Dataset
+(func/train_dataset.py) once and takes the train/validation subsets of it, so the bins are built only once
+and the rows are not pickled per trial.
+
+Output: a leaderboard with one row per (trial, rung): parameters, trees, best iteration, validation MAE, fit time.
+"""
+
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from func.train_dataset import DATASET_PARAMS, weighted_subset
+
+# Searched parameters (LGBMRegressor names, also accepted by lgb.train)
+PARAM_GRID = {
+    'num_leaves': [15, 31, 70, 127, 255],
+    'learning_rate': [0.02, 0.05, 0.1],
+    'min_child_samples': [10, 20, 50, 100],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'reg_lambda': [0.0, 1.0, 10.0]
+}
+# LightGBM defaults of the searched parameters (for the ones base_params does not set)
+PARAM_DEFAULTS = {'num_leaves': 31, 'learning_rate': 0.1, 'min_child_samples': 20, 'subsample': 1.0, 'colsample_bytree': 1.0, 'reg_lambda': 0.0}
+
+# Training data of the worker process (loaded once by the initializer)
+_worker_data = None
+
+
+def _init_worker(dataset_path, train_idx, sample_weight, valid_idx):
+    global _worker_data
+    full_set = lgb.Dataset(dataset_path, params = DATASET_PARAMS).construct()
+    _worker_data = (weighted_subset(full_set, train_idx, sample_weight), full_set.subset(valid_idx))
+
+
+def _fit_trial(args):
+    params, n_rounds, early_stopping_rounds, num_threads = args
+    train_set, valid_set = _worker_data
+    train_params = {'objective': 'regression', 'metric': 'l1', 'verbose': -1, 'num_threads': num_threads, **params}
+    if train_params.get('subsample', 1.0) < 1:
+        # row subsampling is only active with a bagging frequency
+        train_params['subsample_freq'] = 1
+    start = perf_counter()
+    booster = lgb.train(
+        train_params, train_set,
+        num_boost_round = n_rounds,
+        valid_sets = [valid_set],
+        callbacks = [lgb.early_stopping(stopping_rounds = early_stopping_rounds, verbose = False)]
+    )
+    fit_seconds = perf_counter() - start
+    return booster.best_iteration, booster.best_score['valid_0']['l1'], fit_seconds
+
+
+def sample_trials(base_params, n_trials, random_state = 42):
+    """
+    Draws distinct parameter sets from PARAM_GRID; the first one is base_params.
+
+    Parameters:
+        base_params (dict): Current model parameters (kept as trial 0).
+        n_trials (int): Number of parameter sets.
+        random_state (int): Seed of the draw.
+
+    Returns:
+        list: Parameter sets (dicts with the PARAM_GRID keys).
+    """
+    rng = np.random.default_rng(random_state)
+    trials = [{name: base_params.get(name, PARAM_DEFAULTS[name]) for name in PARAM_GRID}]
+    n_combinations = int(np.prod([len(values) for values in PARAM_GRID.values()]))
+    while len(trials) < min(n_trials, n_combinations):
+        params = {name: values[rng.integers(len(values))] for name, values in PARAM_GRID.items()}
+        if params not in trials:
+            trials.append(params)
+    return trials
+
+
+def successive_halving(
+    dataset_path,               # binary Dataset file (FeatureStoreData.dataset)
+    train_idx,                  # training rows (sorted)
+    sample_weight,              # weights of the training rows
+    valid_idx,                  # validation rows (sorted)
+    base_params,                # current model parameters (trial 0)
+    n_trials = 16,              # number of parameter sets
+    min_rounds = 50,            # trees per fit in rung 0
+    max_rounds = 500,           # maximum trees per fit
+    eta = 3,                    # 1 / eta of the trials go to the next rung
+    early_stopping_rounds = 50, # early stopping patience
+    n_workers = 1,              # number of worker processes
+    random_state = 42
+):
+    """
+    Runs the successive halving search.
+
+    Returns:
+        tuple: (best parameter set, leaderboard DataFrame sorted from the best)
+    """
+    global _worker_data
+    # Workers are forked (the scripts have no __main__ guard, so spawned workers would re-run them);
+    # the caller must not have run LightGBM before (OpenMP is not fork-safe), see train_dataset.cache_dataset
+    if 'fork' not in multiprocessing.get_all_start_methods() and n_workers > 1:
+        print("⚠️ 'fork' start method is not available, tuning in a single process")
+        n_workers = 1
+    num_threads = max(1, (os.cpu_count() or 1) // max(1, n_workers))
+    init_args = (dataset_path, train_idx, sample_weight, valid_idx)
+
+    trials = sample_trials(base_params, n_trials, random_state)
+    alive = list(range(len(trials)))
+    rows = list()
+    rung = 0
+    n_rounds = min(min_rounds, max_rounds)
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=init_args
+        )
+    else:
+        _init_worker(*init_args)
+    try:
+        while True:
+            print("Tuning rung {}: {} trials x {} trees...".format(rung, len(alive), n_rounds))
+            tasks = [(trials[i], n_rounds, early_stopping_rounds, num_threads) for i in alive]
+            results = executor.map(_fit_trial, tasks) if executor is not None else map(_fit_trial, tasks)
+            scores = dict()
+            for i, (best_iteration, valid_mae, fit_seconds) in zip(alive, results):
+                scores[i] = valid_mae
+                rows.append({
+                    'trial': i, 'rung': rung, **trials[i], 'n_rounds': n_rounds,
+                    'best_iteration': int(best_iteration), 'valid_mae': float(valid_mae), 'fit_seconds': round(fit_seconds, 2)
+                })
+            alive = sorted(alive, key=lambda i: scores[i])[:max(1, len(alive) // eta)]
+            if len(alive) <= 1 or n_rounds >= max_rounds:
+                break
+            n_rounds = min(n_rounds * eta, max_rounds)
+            rung += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _worker_data = None
+
+    leaderboard = pd.DataFrame(rows).sort_values(by = ['rung', 'valid_mae'], ascending = [False, True]).reset_index(drop = True)
+    best_params = dict(trials[int(leaderboard.loc[0, 'trial'])])
+    if best_params['subsample'] < 1:
+        best_params['subsample_freq'] = 1
+    return best_params, leaderboard